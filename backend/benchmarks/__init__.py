@@ -0,0 +1 @@
+# Empty file - just makes benchmarks a package
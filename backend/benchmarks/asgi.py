@@ -0,0 +1,53 @@
+import json
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+async def call(
+    app, method: str, url: str, body: Optional[object] = None, headers: Optional[Dict[str, str]] = None
+) -> Tuple[int, bytes]:
+    """Drive one HTTP request through an ASGI app in-process and return (status, body)"""
+    parts = urlsplit(url)
+    payload = json.dumps(body).encode() if body is not None else b""
+    raw_headers = [(b"host", b"bench")]
+    raw_headers.extend((k.lower().encode(), v.encode()) for k, v in (headers or {}).items())
+    if body is not None:
+        raw_headers.append((b"content-type", b"application/json"))
+        raw_headers.append((b"content-length", str(len(payload)).encode()))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    status = 0
+    chunks = []
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
@@ -0,0 +1,123 @@
+"""Latency of round assignment against group size.
+
+Seeds a scratch database (the MongoDB pointed to by MONGO_URI, or the
+in-memory backend), then times `assign_deeds_to_members` (storage round trips
+included) and template sampling plus `build_deed_docs` (pure CPU) for a range of group sizes. Every
+repeat is a new round, so from the second on the assignment works around the
+pair history of earlier rounds; `build_deed_docs` is timed with a full
+history and one exclusion pair per ten members.
+
+Usage (from backend/):
+    python -m benchmarks.bench_assignment --sizes 5 20 100 1000 10000 --repeat 20
+    python -m benchmarks.bench_assignment --backend memory
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from services.assignment import (
+    DEFAULT_DEED_TEMPLATES,
+    PAIR_HISTORY_ROUNDS,
+    assign_deeds_to_members,
+    build_deed_docs,
+    build_derangement,
+)
+from services.template_sampler import TemplateSampler
+from storage.base import Storage
+from storage.factory import create_storage
+
+load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env", override=False)
+
+
+async def seed_group(storage: Storage, size: int) -> str:
+    group = await storage.groups.create(f"bench-group-{size}")
+    for i in range(size):
+        user = await storage.users.create(f"bench-{size}-{i}")
+        await storage.members.add(group["_id"], user["_id"])
+    return group["_id"]
+
+
+def constraints(size: int):
+    """A full pair history and one exclusion pair per ten members"""
+    ids = [str(i) for i in range(size)]
+    avoided = {}
+    for _ in range(PAIR_HISTORY_ROUNDS):
+        for giver, target in zip(ids, build_derangement(ids, None, avoided)):
+            avoided[giver] = [target, *avoided.get(giver, ())]
+    excluded = {}
+    for _ in range(size // 10):
+        a, b = random.sample(ids, 2)
+        excluded.setdefault(a, set()).add(b)
+        excluded.setdefault(b, set()).add(a)
+    return excluded, avoided
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+async def run(backend, sizes, repeat):
+    db_name = os.getenv("MONGO_DB_NAME", "secret_santa") + "_bench"
+    try:
+        storage = create_storage(backend, os.getenv("MONGO_URI"), db_name)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    if storage.kind == "mongo":
+        await storage.client.drop_database(db_name)
+    await storage.templates.seed(DEFAULT_DEED_TEMPLATES)
+
+    print(f"{'members':>8} {'assign p50':>12} {'assign max':>12} {'build p50':>12}")
+    try:
+        for size in sizes:
+            group_id = await seed_group(storage, size)
+            members = [{"user_id": str(i), "name": f"m{i}"} for i in range(size)]
+            excluded, avoided = constraints(size) if size > 1 else ({}, {})
+
+            assign_samples, build_samples = [], []
+            for _ in range(repeat):
+                rnd = await storage.rounds.create({"group_id": group_id, "name": "bench", "status": "active",
+                                                   "created_at": datetime.utcnow()})
+                start = time.perf_counter()
+                await assign_deeds_to_members(storage, rnd["_id"], group_id)
+                assign_samples.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                drawn = TemplateSampler(DEFAULT_DEED_TEMPLATES).draw(size)
+                build_deed_docs("bench", members, drawn, excluded, avoided)
+                build_samples.append(time.perf_counter() - start)
+
+            assign, build = summarize(assign_samples), summarize(build_samples)
+            print(f"{size:>8} {assign['p50_ms']:>10.3f}ms {assign['max_ms']:>10.3f}ms {build['p50_ms']:>10.3f}ms")
+    finally:
+        if storage.kind == "mongo":
+            await storage.client.drop_database(db_name)
+        await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["mongo", "memory"], default=os.getenv("STORAGE_BACKEND", "mongo"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 5, 20, 100, 500, 2000, 10000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.backend, args.sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""Per-endpoint latency, allocation and database-call benchmark.
+
+Drives every router through the ASGI app in-process (no HTTP server) against
+the in-memory storage backend, or against the MongoDB in MONGO_URI with
+--backend mongo, for a range of group sizes and amounts of round history.
+
+For each endpoint and group size it reports p50/p95/p99 latency, bytes
+allocated per request (tracemalloc, measured in a separate pass) and database
+calls per request: storage operations on the memory backend, wire commands
+seen by a pymongo CommandListener on the mongo backend.
+
+Usage (from backend/):
+    python -m benchmarks.bench_endpoints --sizes 5 20 100 --output after.json
+    python -m benchmarks.bench_endpoints --budget benchmarks/budgets.json
+    python -m benchmarks.bench_endpoints --write-budget benchmarks/budgets.json
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+import main
+from benchmarks.asgi import call
+from services.assignment import DEFAULT_DEED_TEMPLATES
+from services.etag import round_etag
+from services.template_cache import template_cache
+from services.user_directory import user_directory
+from storage.base import Storage
+from storage.memory import MemoryStorage
+from storage.mongo import MongoStorage
+
+load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env", override=False)
+
+# Wire commands that are connection housekeeping rather than work done for a request
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue"}
+
+
+class DbCallCounter:
+    count = 0
+
+
+class CommandCounter(monitoring.CommandListener):
+    def started(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            DbCallCounter.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class _CountingRepository:
+    def __init__(self, repo):
+        self._repo = repo
+
+    def __getattr__(self, name):
+        attr = getattr(self._repo, name)
+        if not callable(attr):
+            return attr
+
+        # Hand back the coroutine or async generator untouched so scans still stream
+        def counted(*args, **kwargs):
+            DbCallCounter.count += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+class CountingStorage(Storage):
+    """Counts every repository call made through a storage backend"""
+
+    def __init__(self, inner: Storage):
+        self.inner = inner
+        self.kind = inner.kind
+        for name in ("users", "groups", "members", "rounds", "deeds", "templates", "celebrations", "pair_history", "archive", "stats"):
+            setattr(self, name, _CountingRepository(getattr(inner, name)))
+
+    async def close(self):
+        await self.inner.close()
+
+
+class Context:
+    """Ids of the data seeded for one group size"""
+
+    def __init__(self, storage: Storage, size: int):
+        self.storage = storage
+        self.size = size
+        self.group_id = ""
+        self.user_ids: List[str] = []
+        self.user_names: List[str] = []
+        self.round_id = ""
+        self.spare_round_id = ""
+        self.template_id = ""
+        self.import_group_id = ""
+        self.etag = ""
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    path: Callable[[Context, int], str]
+    body: Optional[Callable[[Context, int], object]] = None
+    # Untimed per-iteration setup, e.g. creating the row a DELETE will remove
+    prepare: Optional[Callable[[Context, int], Awaitable[None]]] = None
+    headers: Optional[Callable[[Context, int], dict]] = None
+    # Non-2xx statuses the scenario exists to measure; any other one fails the run
+    expect: Tuple[int, ...] = ()
+
+
+def unexpected_statuses(scenario: Scenario, statuses) -> List[int]:
+    return sorted(s for s in statuses if not 200 <= s < 300 and s not in scenario.expect)
+
+
+async def new_active_round(ctx: Context, name: str) -> str:
+    rnd = await ctx.storage.rounds.create({
+        "group_id": ctx.group_id,
+        "name": name,
+        "status": "active",
+        "total_members": 0,
+        "completed_count": 0,
+        "created_at": datetime.utcnow(),
+    })
+    return rnd["_id"]
+
+
+async def prepare_complete(ctx: Context, i: int):
+    # Every member can only complete once per round, so roll a new round each lap
+    if i % ctx.size == 0:
+        status, body = await call(main.app, "POST", f"/groups/{ctx.group_id}/rounds", {"name": f"lap-{i}"})
+        ctx.spare_round_id = json.loads(body)["_id"]
+
+
+async def prepare_advance(ctx: Context, i: int):
+    ctx.spare_round_id = await new_active_round(ctx, f"advance-{i}")
+
+
+async def prepare_delete_template(ctx: Context, i: int):
+    ctx.template_id = (await ctx.storage.templates.create(f"bench template {i} for {{target}}"))["_id"]
+
+
+async def prepare_join(ctx: Context, i: int):
+    ctx.user_ids.append((await ctx.storage.users.create(f"joiner-{ctx.size}-{i}"))["_id"])
+
+
+async def prepare_import(ctx: Context, i: int):
+    # Imports join a group of their own, so the seeded group keeps its size
+    ctx.import_group_id = (await ctx.storage.groups.create(f"import-{ctx.size}-{i}"))["_id"]
+
+
+async def prepare_etag(ctx: Context, i: int):
+    # Revalidation scenarios replay the ETag a client got from its last full response
+    ctx.etag = round_etag(ctx.round_id, await ctx.storage.rounds.get_version(ctx.round_id))
+
+
+def member(ctx: Context, i: int) -> str:
+    return ctx.user_ids[i % ctx.size]
+
+
+SCENARIOS: List[Scenario] = [
+    # users
+    Scenario("GET /users/", "GET", lambda c, i: "/users/"),
+    Scenario("POST /users/", "POST", lambda c, i: "/users/", lambda c, i: {"name": f"new-{c.size}-{i}"}),
+    Scenario("GET /users/login/{name}", "GET", lambda c, i: f"/users/login/{c.user_names[i % c.size]}"),
+    Scenario("GET /users/{user_id}", "GET", lambda c, i: f"/users/{member(c, i)}"),
+    Scenario("GET /users/{user_id}/groups", "GET", lambda c, i: f"/users/{member(c, i)}/groups"),
+    Scenario("POST /users/import", "POST", lambda c, i: "/users/import",
+             lambda c, i: [{"name": f"imported-{c.size}-{i}-{n}", "group_id": c.import_group_id} for n in range(c.size)],
+             prepare=prepare_import),
+    # groups
+    Scenario("GET /groups/", "GET", lambda c, i: "/groups/"),
+    Scenario("POST /groups/", "POST", lambda c, i: "/groups/", lambda c, i: {"name": f"group-{i}"}),
+    Scenario("GET /groups/{group_id}", "GET", lambda c, i: f"/groups/{c.group_id}"),
+    Scenario("POST /groups/{group_id}/join", "POST",
+             lambda c, i: f"/groups/{c.group_id}/join?user_id={c.user_ids[-1]}", prepare=prepare_join),
+    Scenario("GET /groups/{group_id}/members", "GET", lambda c, i: f"/groups/{c.group_id}/members"),
+    Scenario("GET /groups/{group_id}/rounds", "GET", lambda c, i: f"/groups/{c.group_id}/rounds"),
+    Scenario("GET /groups/{group_id}/current-round", "GET", lambda c, i: f"/groups/{c.group_id}/current-round"),
+    Scenario("GET /groups/{group_id}/dashboard", "GET",
+             lambda c, i: f"/groups/{c.group_id}/dashboard?user_id={member(c, i)}"),
+    Scenario("GET /groups/{group_id}/stats", "GET", lambda c, i: f"/groups/{c.group_id}/stats"),
+    # rounds
+    Scenario("GET /rounds/{round_id}", "GET", lambda c, i: f"/rounds/{c.round_id}"),
+    Scenario("GET /rounds/{round_id}/status", "GET", lambda c, i: f"/rounds/{c.round_id}/status"),
+    Scenario("GET /rounds/{round_id}/status (304)", "GET", lambda c, i: f"/rounds/{c.round_id}/status",
+             prepare=prepare_etag, headers=lambda c, i: {"If-None-Match": c.etag}, expect=(304,)),
+    Scenario("GET /rounds/{round_id}/check-complete", "GET",
+             lambda c, i: f"/rounds/{c.round_id}/check-complete?user_id={member(c, i)}"),
+    Scenario("GET /rounds/{round_id}/my-deed", "GET", lambda c, i: f"/rounds/{c.round_id}/my-deed?user_id={member(c, i)}"),
+    Scenario("GET /rounds/{round_id}/deeds", "GET", lambda c, i: f"/rounds/{c.round_id}/deeds"),
+    Scenario("POST /rounds/{round_id}/celebration-seen", "POST",
+             lambda c, i: f"/rounds/{c.round_id}/celebration-seen?user_id=bench-{i}"),
+    Scenario("POST /rounds/{round_id}/complete", "POST",
+             lambda c, i: f"/rounds/{c.spare_round_id}/complete?user_id={member(c, i)}", prepare=prepare_complete),
+    Scenario("POST /rounds/{round_id}/advance", "POST",
+             lambda c, i: f"/rounds/{c.spare_round_id}/advance", prepare=prepare_advance),
+    Scenario("POST /groups/{group_id}/rounds", "POST",
+             lambda c, i: f"/groups/{c.group_id}/rounds", lambda c, i: {"name": f"round-{i}"}),
+    # deeds
+    Scenario("GET /deeds/templates", "GET", lambda c, i: "/deeds/templates"),
+    Scenario("POST /deeds/templates", "POST", lambda c, i: "/deeds/templates",
+             lambda c, i: {"description": f"created {c.size}-{i} for {{target}}"}),
+    Scenario("DELETE /deeds/templates/{template_id}", "DELETE",
+             lambda c, i: f"/deeds/templates/{c.template_id}", prepare=prepare_delete_template),
+    Scenario("GET /deeds/random", "GET", lambda c, i: "/deeds/random"),
+    Scenario("POST /deeds/seed", "POST", lambda c, i: "/deeds/seed"),
+    Scenario("POST /deeds/templates/import", "POST", lambda c, i: "/deeds/templates/import",
+             lambda c, i: [f"imported {i}-{n} for {{target}}" for n in range(c.size)]),
+    # stats
+    Scenario("GET /stats/", "GET", lambda c, i: "/stats/"),
+]
+
+
+async def seed(storage: Storage, size: int, history: int) -> Context:
+    """One group of `size` members with `history` completed rounds and a half-done active round"""
+    ctx = Context(storage, size)
+    template_cache.invalidate()
+    user_directory.invalidate()
+    await storage.templates.seed(DEFAULT_DEED_TEMPLATES)
+
+    group = await storage.groups.create(f"bench-{size}")
+    ctx.group_id = group["_id"]
+    for i in range(size):
+        user = await storage.users.create(f"member-{size}-{i}")
+        ctx.user_ids.append(user["_id"])
+        ctx.user_names.append(user["name"])
+        await storage.members.add(ctx.group_id, user["_id"])
+
+    for h in range(history + 1):
+        status, body = await call(main.app, "POST", f"/groups/{ctx.group_id}/rounds", {"name": f"history-{h}"})
+        ctx.round_id = json.loads(body)["_id"]
+
+    for user_id in ctx.user_ids[: size // 2]:
+        await call(main.app, "POST", f"/rounds/{ctx.round_id}/complete?user_id={user_id}")
+    return ctx
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def check_status(scenario: Scenario, ctx: Context, status: int, response: bytes):
+    """Stop the run on an error response, which would otherwise be measured as if it were the endpoint"""
+    if unexpected_statuses(scenario, [status]):
+        raise SystemExit(f"{scenario.name} @{ctx.size}: unexpected {status} response {response[:200]!r}")
+
+
+async def run_scenario(scenario: Scenario, ctx: Context, iterations: int, alloc_iterations: int) -> dict:
+    latencies, db_calls, statuses = [], [], set()
+    for i in range(iterations):
+        if scenario.prepare:
+            await scenario.prepare(ctx, i)
+        path = scenario.path(ctx, i)
+        body = scenario.body(ctx, i) if scenario.body else None
+
+        DbCallCounter.count = 0
+        start = time.perf_counter()
+        headers = scenario.headers(ctx, i) if scenario.headers else None
+        status, response = await call(main.app, scenario.method, path, body, headers)
+        latencies.append(time.perf_counter() - start)
+        db_calls.append(DbCallCounter.count)
+        statuses.add(status)
+        check_status(scenario, ctx, status, response)
+
+    # Allocation pass runs separately so tracemalloc overhead does not skew latency
+    allocations = []
+    tracemalloc.start()
+    try:
+        for i in range(iterations, iterations + alloc_iterations):
+            if scenario.prepare:
+                await scenario.prepare(ctx, i)
+            path = scenario.path(ctx, i)
+            body = scenario.body(ctx, i) if scenario.body else None
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            headers = scenario.headers(ctx, i) if scenario.headers else None
+            status, response = await call(main.app, scenario.method, path, body, headers)
+            _, peak = tracemalloc.get_traced_memory()
+            check_status(scenario, ctx, status, response)
+            allocations.append(peak - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "endpoint": scenario.name,
+        "group_size": ctx.size,
+        "statuses": sorted(statuses),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "peak_alloc_kib": round(statistics.median(allocations) / 1024, 1) if allocations else None,
+        "db_calls": max(db_calls),
+    }
+
+
+def open_storage(backend: str, db_name: str) -> Storage:
+    if backend == "memory":
+        return CountingStorage(MemoryStorage())
+
+    uri = os.getenv("MONGO_URI")
+    if not uri:
+        raise SystemExit("MONGO_URI is not set")
+    client = AsyncIOMotorClient(uri, event_listeners=[CommandCounter()])
+    return MongoStorage(client, client[db_name])
+
+
+def budget_key(row: dict) -> str:
+    return f"{row['endpoint']} @{row['group_size']}"
+
+
+def check_budget(rows: List[dict], budget: dict, tolerance: float) -> List[str]:
+    """Compare results against a budget file; returns one message per regression"""
+    failures = []
+    expect = {s.name: s for s in SCENARIOS}
+    for row in rows:
+        scenario = expect.get(row["endpoint"])
+        bad = unexpected_statuses(scenario, row["statuses"]) if scenario else []
+        if bad:
+            failures.append(f"{budget_key(row)}: unexpected statuses {bad}")
+        limits = budget.get(budget_key(row))
+        if not limits:
+            continue
+        if "db_calls" in limits and row["db_calls"] > limits["db_calls"]:
+            failures.append(f"{budget_key(row)}: {row['db_calls']} db calls > budget {limits['db_calls']}")
+        if "p95_ms" in limits and row["p95_ms"] > limits["p95_ms"] * (1 + tolerance):
+            failures.append(f"{budget_key(row)}: p95 {row['p95_ms']}ms > budget {limits['p95_ms']}ms")
+    return failures
+
+
+async def run(args) -> List[dict]:
+    db_name = os.getenv("MONGO_DB_NAME", "secret_santa") + "_bench"
+    storage = open_storage(args.backend, db_name)
+    if args.backend == "mongo":
+        await storage.client.drop_database(db_name)
+    main.Backend.storage = storage
+
+    only = set(args.endpoints or [])
+    rows = []
+    try:
+        for size in args.sizes:
+            ctx = await seed(storage, size, args.history)
+            for scenario in SCENARIOS:
+                if only and scenario.name not in only:
+                    continue
+                row = await run_scenario(scenario, ctx, args.iterations, args.alloc_iterations)
+                rows.append(row)
+                print(f"{row['endpoint']:<42} {size:>5} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} "
+                      f"{row['p99_ms']:>9.3f} {row['peak_alloc_kib']:>9} {row['db_calls']:>5}", file=sys.stderr)
+    finally:
+        if args.backend == "mongo":
+            await storage.client.drop_database(db_name)
+        await storage.close()
+        main.Backend.storage = None
+    return rows
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["memory", "mongo"], default="memory")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 100])
+    parser.add_argument("--history", type=int, default=5, help="completed rounds seeded per group")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--alloc-iterations", type=int, default=20)
+    parser.add_argument("--endpoints", nargs="*", help="only run these endpoint names")
+    parser.add_argument("--output", help="write results JSON here instead of stdout")
+    parser.add_argument("--budget", help="budget JSON to check results against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed latency overshoot for budgets")
+    parser.add_argument("--write-budget", help="write db-call budgets from this run")
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<42} {'size':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'alloc KiB':>9} {'db':>5}",
+          file=sys.stderr)
+    rows = asyncio.run(run(args))
+
+    report = {
+        "backend": args.backend,
+        "iterations": args.iterations,
+        "history": args.history,
+        "generated_at": datetime.utcnow().isoformat(),
+        "results": rows,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.write_budget:
+        budget = {budget_key(row): {"db_calls": row["db_calls"]} for row in rows}
+        Path(args.write_budget).write_text(json.dumps(budget, indent=2, sort_keys=True) + "\n")
+
+    if args.budget:
+        failures = check_budget(rows, json.loads(Path(args.budget).read_text()), args.tolerance)
+        for failure in failures:
+            print(f"BUDGET EXCEEDED {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
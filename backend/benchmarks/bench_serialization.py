@@ -0,0 +1,127 @@
+"""Throughput of the fast serialization path against the response_model path.
+
+Seeds the same data as bench_endpoints, then drives every read endpoint
+through the ASGI app with FAST_SERIALIZATION off and on, alternating rounds
+so both modes see the same cache and allocator state. Reports requests per
+second for each mode and the speedup, and fails if the two modes ever
+produce different response bodies.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization --sizes 20 100 1000
+    python -m benchmarks.bench_serialization --backend mongo --page-size 1000
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List
+
+from dotenv import load_dotenv
+
+import main
+from benchmarks.asgi import call
+from benchmarks.bench_endpoints import SCENARIOS, Context, Scenario, open_storage, seed
+from services import serialization
+
+load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env", override=False)
+
+
+def read_scenarios(names: List[str]) -> List[Scenario]:
+    # Only side-effect free reads: both modes must see identical data
+    return [
+        s for s in SCENARIOS
+        if s.method == "GET" and s.prepare is None and s.name != "GET /deeds/random"
+        and (not names or s.name in names)
+    ]
+
+
+async def timed(scenario: Scenario, ctx: Context, iterations: int, page_size: int, fast: bool):
+    serialization.FAST_SERIALIZATION = fast
+    bodies = set()
+    start = time.perf_counter()
+    for i in range(iterations):
+        path = scenario.path(ctx, i)
+        if scenario.name.endswith(("/", "/rounds", "/deeds", "/templates")):
+            path += f"?limit={page_size}"
+        status, body = await call(main.app, scenario.method, path)
+        if i < ctx.size:
+            bodies.add((path, status, body))
+    return iterations / (time.perf_counter() - start), bodies
+
+
+async def run(args) -> List[dict]:
+    db_name = os.getenv("MONGO_DB_NAME", "secret_santa") + "_bench"
+    storage = open_storage(args.backend, db_name)
+    if args.backend == "mongo":
+        await storage.client.drop_database(db_name)
+    main.Backend.storage = storage
+    enabled = serialization.FAST_SERIALIZATION
+
+    rows = []
+    try:
+        for size in args.sizes:
+            ctx = await seed(storage, size, args.history)
+            for scenario in read_scenarios(args.endpoints):
+                rates = {False: [], True: []}
+                bodies = {False: set(), True: set()}
+                for _ in range(args.rounds):
+                    for fast in (False, True):
+                        rate, seen = await timed(scenario, ctx, args.iterations, args.page_size, fast)
+                        rates[fast].append(rate)
+                        bodies[fast] |= seen
+
+                row = {
+                    "endpoint": scenario.name,
+                    "group_size": size,
+                    "model_rps": round(max(rates[False]), 1),
+                    "fast_rps": round(max(rates[True]), 1),
+                    "speedup": round(max(rates[True]) / max(rates[False]), 2),
+                    "identical": bodies[False] == bodies[True],
+                }
+                rows.append(row)
+                print(f"{row['endpoint']:<42} {size:>5} {row['model_rps']:>10} {row['fast_rps']:>10} "
+                      f"{row['speedup']:>7}x {'' if row['identical'] else 'BODY MISMATCH'}", file=sys.stderr)
+    finally:
+        serialization.FAST_SERIALIZATION = enabled
+        if args.backend == "mongo":
+            await storage.client.drop_database(db_name)
+        await storage.close()
+        main.Backend.storage = None
+    return rows
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["memory", "mongo"], default="memory")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 1000])
+    parser.add_argument("--history", type=int, default=5, help="completed rounds seeded per group")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3, help="alternating off/on passes; best is kept")
+    parser.add_argument("--page-size", type=int, default=1000, help="limit passed to paginated list endpoints")
+    parser.add_argument("--endpoints", nargs="*", help="only run these endpoint names")
+    parser.add_argument("--output", help="write results JSON here instead of stdout")
+    args = parser.parse_args()
+
+    engine = "orjson" if serialization.orjson is not None else "json"
+    print(f"encoder: {engine}", file=sys.stderr)
+    print(f"{'endpoint':<42} {'size':>5} {'model rps':>10} {'fast rps':>10} {'speedup':>8}", file=sys.stderr)
+    rows = asyncio.run(run(args))
+
+    report = {"backend": args.backend, "encoder": engine, "iterations": args.iterations, "results": rows}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+    if not all(row["identical"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
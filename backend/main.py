@@ -1,4 +1,5 @@
 from contextlib import asynccontextmanager
+import asyncio
 import os
 from pathlib import Path
 from typing import AsyncGenerator
@@ -8,12 +9,22 @@ from fastapi.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from dotenv import load_dotenv
 
+from services.invalidation import invalidator
+from services.metrics import MetricsMiddleware, metrics_response, mongo_event_listeners
+from services.migrations import MigrationError, apply_migrations
+from services.scheduler import Scheduler
+from storage.base import Storage
+from storage.factory import create_storage
+
 # Load environment variables
 ENV_PATH = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=ENV_PATH, override=False)
 
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "secret_santa")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")  # "mongo" or "memory"
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "true").lower() == "true"
+RUN_SCHEDULER = os.getenv("RUN_SCHEDULER", "false").lower() == "true"
 
 
 class Mongo:
@@ -21,21 +32,57 @@ class Mongo:
     db: AsyncIOMotorDatabase = None
 
 
+class Backend:
+    storage: Storage = None
+
+
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
-    if MONGO_URI:
-        Mongo.client = AsyncIOMotorClient(MONGO_URI)
-        Mongo.db = Mongo.client[MONGO_DB_NAME]
+    try:
+        storage = create_storage(STORAGE_BACKEND, MONGO_URI, MONGO_DB_NAME, event_listeners=mongo_event_listeners())
+    except ValueError as e:
+        storage = None
+        print(f"[backend] Warning: {e}")
+
+    if storage is not None and storage.kind == "memory":
+        print("[backend] Using in-memory storage; data will not survive a restart")
+    elif storage is not None:
+        Mongo.client, Mongo.db = storage.client, storage.db
         try:
             await Mongo.client.admin.command("ping")
             print(f"[backend] Connected to MongoDB '{MONGO_DB_NAME}'")
         except Exception as e:
             print(f"[backend] MongoDB ping failed: {e}")
-    else:
-        print("[backend] Warning: MONGO_URI not set")
+
+        if RUN_MIGRATIONS_ON_STARTUP:
+            # A failed migration stops startup: later ones and the routes may depend on it
+            try:
+                applied = await apply_migrations(Mongo.db)
+            except MigrationError as e:
+                print(f"[backend] Schema migration failed, not starting: {e}")
+                raise
+            if applied:
+                print(f"[backend] Applied schema migrations {applied}")
+    # Routes only see the storage once the schema is up to date
+    Backend.storage = storage
+
+    # Keeps this worker's caches in step with writes made by other workers
+    invalidation_task = None
+    if Mongo.db is not None:
+        invalidation_task = asyncio.create_task(invalidator.run(Mongo.db))
+
+    scheduler_task = None
+    if RUN_SCHEDULER and Backend.storage is not None:
+        scheduler_task = asyncio.create_task(Scheduler(Backend.storage).run_forever())
+        print("[backend] Round rotation scheduler started")
 
     yield
 
+    if scheduler_task:
+        scheduler_task.cancel()
+    if invalidation_task:
+        invalidation_task.cancel()
+
     if Mongo.client:
         Mongo.client.close()
         print("[backend] MongoDB connection closed")
@@ -52,11 +99,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency, status codes and Mongo commands, scraped from /metrics
+app.add_middleware(MetricsMiddleware, routes_from=app)
+app.add_route("/metrics", metrics_response, include_in_schema=False)
+
 
-async def get_db() -> AsyncIOMotorDatabase:
-    if Mongo.db is None:
+async def get_storage() -> Storage:
+    if Backend.storage is None:
         raise HTTPException(status_code=500, detail="Database not connected")
-    return Mongo.db
+    return Backend.storage
 
 
 @app.get("/health")
@@ -65,9 +116,10 @@ async def health():
 
 
 # Import and register routers
-from routes import users, groups, rounds, deeds
+from routes import users, groups, rounds, deeds, stats
 
 app.include_router(users.router)
 app.include_router(groups.router)
 app.include_router(rounds.router)
-app.include_router(deeds.router)
\ No newline at end of file
+app.include_router(deeds.router)
+app.include_router(stats.router)
\ No newline at end of file
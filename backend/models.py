@@ -9,6 +9,11 @@ class UserCreate(BaseModel):
     name: str
 
 
+class UserImportRow(BaseModel):
+    name: str
+    group_id: Optional[str] = None  # group to join, if any
+
+
 class User(BaseModel):
     id: str = Field(alias="_id")
     name: str
@@ -33,6 +38,12 @@ class Group(BaseModel):
         populate_by_name = True
 
 
+class ExclusionPair(BaseModel):
+    # Neither member is ever assigned the other
+    user_id: str
+    other_user_id: str
+
+
 # ============ ROUNDS ============
 
 class RoundCreate(BaseModel):
@@ -45,6 +56,7 @@ class Round(BaseModel):
     name: str
     status: str  # "active", "completed", or "celebrating"
     created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
 
     class Config:
         populate_by_name = True
@@ -102,4 +114,35 @@ class MemberStatus(BaseModel):
     deed_description: Optional[str] = None
 
     class Config:
-        populate_by_name = True
\ No newline at end of file
+        populate_by_name = True
+
+class RoundCompletion(BaseModel):
+    round_id: str
+    total_members: int
+    completed_count: int
+    all_complete: bool
+    show_celebration: bool
+    round_completed: bool
+    new_round_id: Optional[str] = None
+
+
+class RoundStats(BaseModel):
+    group_id: Optional[str] = None  # None for the stats of every group
+    rounds_started: int
+    rounds_completed: int  # ended, by advancing or starting another round
+    rounds_fully_completed: int  # every deed done
+    deeds_assigned: int
+    deeds_completed: int
+    # Rates and averages are None until there is something to divide by
+    deed_completion_rate: Optional[float] = None
+    round_completion_rate: Optional[float] = None
+    avg_deed_seconds: Optional[float] = None
+    avg_round_seconds: Optional[float] = None
+
+
+class GroupDashboard(BaseModel):
+    group: Group
+    current_round: Optional[Round] = None  # None until the group's first round
+    members: List[MemberStatus] = []
+    completion: Optional[RoundCompletion] = None
+    my_deed: Optional[DeedAssignment] = None  # Only when user_id is given and has a deed
@@ -3,78 +3,141 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-import random
-from datetime import datetime
-from typing import List
+from typing import AsyncIterator, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import ValidationError
 
-from main import get_db
+from main import get_storage
 from models import DeedTemplate, DeedTemplateCreate
+from services.bulk import MAX_REPORTED_ERRORS, NotAnArray, Row, batched, json_array_rows, ndjson_rows
+from services.invalidation import TEMPLATES, invalidator
+from services.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    decode_id_cursor,
+    id_cursor,
+    ndjson_response,
+)
+from services.serialization import prebuilt_response
+from services.template_cache import template_cache
+from storage.base import Storage
 
 router = APIRouter(prefix="/deeds", tags=["deeds"])
 
 
 @router.get("/templates", response_model=List[DeedTemplate])
-async def list_deed_templates(db: AsyncIOMotorDatabase = Depends(get_db)):
-    """Get all deed templates"""
-    templates_col = db["deed_templates"]
-    items = []
-    async for t in templates_col.find():
-        t["_id"] = str(t["_id"])
-        items.append(DeedTemplate(**t))
-    return items
+async def list_deed_templates(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    storage: Storage = Depends(get_storage),
+):
+    """Get deed templates a page at a time, served from the template cache"""
+    after = decode_id_cursor(cursor)
+    # The cached pool is already in `_id` order
+    templates = [t for t in await template_cache.get(storage) if after is None or t.id > after]
+    if stream:
+        return ndjson_response(_as_docs(templates), DeedTemplate)
+    headers = {}
+    if len(templates) > limit:
+        headers[NEXT_CURSOR_HEADER] = id_cursor({"_id": templates[limit - 1].id})
+    response.headers.update(headers)
+    return prebuilt_response(templates[:limit], headers)
+
+
+async def _as_docs(templates: List[DeedTemplate]):
+    for t in templates:
+        yield t.model_dump(by_alias=True)
 
 
 @router.post("/templates", response_model=DeedTemplate)
-async def create_deed_template(payload: DeedTemplateCreate, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def create_deed_template(payload: DeedTemplateCreate, storage: Storage = Depends(get_storage)):
     """Add a new deed template to the pool"""
-    templates_col = db["deed_templates"]
-
-    doc = {
-        "description": payload.description,
-        "created_at": datetime.utcnow(),
-    }
-    res = await templates_col.insert_one(doc)
-    doc["_id"] = str(res.inserted_id)
+    doc = await storage.templates.create(payload.description)
+    if not doc:
+        raise HTTPException(status_code=400, detail="Template already exists")
+
+    await invalidator.wrote(TEMPLATES)
     return DeedTemplate(**doc)
 
 
+@router.post("/templates/import")
+async def import_deed_templates(request: Request, storage: Storage = Depends(get_storage)):
+    """Bulk-add templates from a JSON array or an NDJSON stream (Content-Type: application/x-ndjson)"""
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        rows = ndjson_rows(request.stream())
+    else:
+        rows = json_array_rows(request.stream())
+
+    try:
+        return await _import_templates(storage, rows)
+    except NotAnArray:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+
+
+async def _import_templates(storage: Storage, rows: AsyncIterator[Row]) -> dict:
+    inserted = duplicates = invalid = 0
+    errors = []
+    # Each batch is one bulk upsert; both formats are parsed as the body arrives, never held in full
+    async for batch in batched(rows):
+        descriptions = []
+        for row in batch:
+            description, error = _template_description(row)
+            if error:
+                invalid += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": row.line, "error": error})
+            else:
+                descriptions.append(description)
+
+        added = await storage.templates.seed(descriptions)
+        inserted += added
+        duplicates += len(descriptions) - added
+
+    if inserted:
+        await invalidator.wrote(TEMPLATES)
+
+    return {"inserted": inserted, "duplicates": duplicates, "invalid": invalid, "errors": errors}
+
+
+def _template_description(row: Row):
+    """Accept either a bare description string or a {"description": ...} object"""
+    if row.error:
+        return None, row.error
+    value = {"description": row.value} if isinstance(row.value, str) else row.value
+    try:
+        return DeedTemplateCreate.model_validate(value).description, None
+    except ValidationError as e:
+        return None, e.errors()[0]["msg"]
+
+
 @router.delete("/templates/{template_id}")
-async def delete_deed_template(template_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def delete_deed_template(template_id: str, storage: Storage = Depends(get_storage)):
     """Delete a deed template"""
-    templates_col = db["deed_templates"]
-
-    result = await templates_col.delete_one({"_id": ObjectId(template_id)})
-    if result.deleted_count == 0:
+    if not await storage.templates.delete(template_id):
         raise HTTPException(status_code=404, detail="Template not found")
 
+    await invalidator.wrote(TEMPLATES)
+
     return {"deleted": True}
 
 
 @router.get("/random", response_model=DeedTemplate)
-async def get_random_deed(db: AsyncIOMotorDatabase = Depends(get_db)):
+async def get_random_deed(storage: Storage = Depends(get_storage)):
     """Get a random deed from the pool"""
-    templates_col = db["deed_templates"]
-
-    templates = []
-    async for t in templates_col.find():
-        t["_id"] = str(t["_id"])
-        templates.append(DeedTemplate(**t))
-
-    if not templates:
+    template = await template_cache.random(storage)
+    if not template:
         raise HTTPException(status_code=404, detail="No deed templates found. Please seed the database first.")
 
-    return random.choice(templates)
+    return template
 
 
 @router.post("/seed")
-async def seed_deed_templates(db: AsyncIOMotorDatabase = Depends(get_db)):
+async def seed_deed_templates(storage: Storage = Depends(get_storage)):
     """Seed the database with default deed templates - use {target} as placeholder"""
-    templates_col = db["deed_templates"]
-
     default_deeds = [
         "Give {target} a genuine compliment",
         "Buy {target} their favorite drink or snack",
@@ -93,14 +156,9 @@ async def seed_deed_templates(db: AsyncIOMotorDatabase = Depends(get_db)):
         "Bring {target}'s favorite treat to share",
     ]
 
-    count = 0
-    for deed in default_deeds:
-        existing = await templates_col.find_one({"description": deed})
-        if not existing:
-            await templates_col.insert_one({
-                "description": deed,
-                "created_at": datetime.utcnow(),
-            })
-            count += 1
-
-    return {"seeded": count, "message": f"Added {count} new deed templates"}
\ No newline at end of file
+    count = await storage.templates.seed(default_deeds)
+
+    if count:
+        await invalidator.wrote(TEMPLATES)
+
+    return {"seeded": count, "message": f"Added {count} new deed templates"}
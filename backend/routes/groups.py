@@ -3,238 +3,206 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-import random
-from datetime import datetime
-from typing import List
-
-from fastapi import APIRouter, Depends, HTTPException, Query
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from bson import ObjectId
-
-from main import get_db
-from models import Group, GroupCreate, User, Round, RoundCreate
+import asyncio
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+
+from main import get_storage
+from models import ExclusionPair, Group, GroupCreate, GroupDashboard, User, Round, RoundCreate, RoundStats
+from services.archive import scan_rounds
+from services.counters import round_completion
+from services.etag import etag_headers, is_not_modified, not_modified, round_etag
+from services.events import ROUND_ADVANCED, round_events
+from services.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    created_at_cursor,
+    decode_created_at_cursor,
+    decode_id_cursor,
+    ndjson_response,
+    paginate,
+)
+from services.rotation import open_round
+from services.serialization import model_response, models_response
+from services.stats import summarize
+from services.user_directory import user_directory
+from storage.base import Storage
 
 router = APIRouter(prefix="/groups", tags=["groups"])
 
 
-async def get_random_deed_template(db: AsyncIOMotorDatabase) -> str:
-    """Helper to get a random deed template"""
-    templates_col = db["deed_templates"]
-    templates = []
-    async for t in templates_col.find():
-        templates.append(t["description"])
-
-    if not templates:
-        templates = [
-            "Do something kind for {target} today",
-            "Give {target} a genuine compliment",
-            "Help {target} with a task without being asked",
-            "Buy {target} their favorite drink or snack",
-            "Write a thank you note to {target}",
-            "Send {target} an encouraging message",
-        ]
-
-    return random.choice(templates)
-
-
-async def assign_deeds_to_members(db: AsyncIOMotorDatabase, round_id: str, group_id: str):
-    """Assign random deeds to all group members, each targeting another member"""
-    members_col = db["group_members"]
-    users_col = db["users"]
-    deeds_col = db["deeds"]
-
-    # Get all group members with their user info
-    members = []
-    async for m in members_col.find({"group_id": group_id}):
-        user = await users_col.find_one({"_id": ObjectId(m["user_id"])})
-        if user:
-            members.append({
-                "user_id": m["user_id"],
-                "name": user["name"]
-            })
-
-    if len(members) < 2:
-        for member in members:
-            deed_template = await get_random_deed_template(db)
-            deed_description = deed_template.replace("{target}", "someone")
-            await deeds_col.insert_one({
-                "round_id": round_id,
-                "user_id": member["user_id"],
-                "target_user_id": None,
-                "target_user_name": None,
-                "deed_description": deed_description,
-                "completed": False,
-                "completed_at": None,
-                "created_at": datetime.utcnow(),
-            })
-        return
-
-    # Create a shuffled list of targets (Secret Santa style)
-    member_ids = [m["user_id"] for m in members]
-    targets = member_ids.copy()
-
-    # Shuffle until no one is assigned to themselves
-    max_attempts = 100
-    for _ in range(max_attempts):
-        random.shuffle(targets)
-        valid = True
-        for i, member_id in enumerate(member_ids):
-            if member_id == targets[i]:
-                valid = False
-                break
-        if valid:
-            break
-
-    # Assign deeds
-    for i, member in enumerate(members):
-        target_id = targets[i]
-        target_member = next((m for m in members if m["user_id"] == target_id), None)
-        target_name = target_member["name"] if target_member else "someone"
-
-        deed_template = await get_random_deed_template(db)
-        deed_description = deed_template.replace("{target}", target_name)
-
-        await deeds_col.insert_one({
-            "round_id": round_id,
-            "user_id": member["user_id"],
-            "target_user_id": target_id,
-            "target_user_name": target_name,
-            "deed_description": deed_description,
-            "completed": False,
-            "completed_at": None,
-            "created_at": datetime.utcnow(),
-        })
-
-
 @router.get("/", response_model=List[Group])
-async def list_groups(db: AsyncIOMotorDatabase = Depends(get_db)):
-    """List all groups"""
-    groups_col = db["groups"]
-    items = []
-    async for g in groups_col.find():
-        g["_id"] = str(g["_id"])
-        items.append(Group(**g))
-    return items
+async def list_groups(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    storage: Storage = Depends(get_storage),
+):
+    """List groups a page at a time, or every group as NDJSON with stream=true"""
+    after = decode_id_cursor(cursor)
+    if stream:
+        return ndjson_response(storage.groups.scan(after), Group)
+    return await paginate(storage.groups.scan(after, limit + 1), Group, limit, response)
 
 
 @router.post("/", response_model=Group)
-async def create_group(payload: GroupCreate, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def create_group(payload: GroupCreate, storage: Storage = Depends(get_storage)):
     """Create a new group"""
-    groups_col = db["groups"]
-
-    doc = {
-        "name": payload.name,
-        "created_at": datetime.utcnow(),
-    }
-    res = await groups_col.insert_one(doc)
-    doc["_id"] = str(res.inserted_id)
-    return Group(**doc)
+    return Group(**await storage.groups.create(payload.name))
 
 
 @router.get("/{group_id}", response_model=Group)
-async def get_group(group_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def get_group(group_id: str, storage: Storage = Depends(get_storage)):
     """Get group details"""
-    groups_col = db["groups"]
-    group = await groups_col.find_one({"_id": ObjectId(group_id)})
+    group = await storage.groups.get(group_id)
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
-    group["_id"] = str(group["_id"])
-    return Group(**group)
+    return model_response(Group, group)
 
 
 @router.post("/{group_id}/join", response_model=dict)
-async def join_group(group_id: str, user_id: str = Query(...), db: AsyncIOMotorDatabase = Depends(get_db)):
+async def join_group(group_id: str, user_id: str = Query(...), storage: Storage = Depends(get_storage)):
     """Join a group by user_id"""
-    groups_col = db["groups"]
-    users_col = db["users"]
-    members_col = db["group_members"]
-
-    group = await groups_col.find_one({"_id": ObjectId(group_id)})
+    group = await storage.groups.get(group_id)
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
 
-    user = await users_col.find_one({"_id": ObjectId(user_id)})
+    user = await user_directory.get(storage, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    await members_col.update_one(
-        {"group_id": group_id, "user_id": user_id},
-        {"$setOnInsert": {"group_id": group_id, "user_id": user_id, "joined_at": datetime.utcnow()}},
-        upsert=True,
-    )
+    await storage.members.add(group_id, user_id)
+    # Every round's status, completed ones included, lists the current members;
+    # archiving keeps the number of live rounds to bump small
+    await storage.rounds.touch_group(group_id)
 
     return {"joined": True, "group_id": group_id, "user_id": user_id}
 
 
 @router.get("/{group_id}/members", response_model=List[User])
-async def get_group_members(group_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def get_group_members(group_id: str, storage: Storage = Depends(get_storage)):
     """Get all members of a group"""
-    members_col = db["group_members"]
-    users_col = db["users"]
+    user_ids = await storage.members.list_user_ids(group_id)
+    return models_response(User, await user_directory.get_many(storage, user_ids))
+
 
-    cursor = members_col.find({"group_id": group_id})
-    users = []
-    async for m in cursor:
-        user = await users_col.find_one({"_id": ObjectId(m["user_id"])})
-        if user:
-            user["_id"] = str(user["_id"])
-            users.append(User(**user))
-    return users
+@router.get("/{group_id}/exclusions", response_model=List[ExclusionPair])
+async def get_exclusions(group_id: str, storage: Storage = Depends(get_storage)):
+    """List the pairs of members who are never assigned each other"""
+    group = await storage.groups.get(group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    return [ExclusionPair(user_id=a, other_user_id=b) for a, b in group.get("exclusions", [])]
+
+
+@router.put("/{group_id}/exclusions", response_model=List[ExclusionPair])
+async def set_exclusions(group_id: str, pairs: List[ExclusionPair], storage: Storage = Depends(get_storage)):
+    """Replace the exclusion pairs; they apply from the next round"""
+    if any(p.user_id == p.other_user_id for p in pairs):
+        raise HTTPException(status_code=400, detail="A member cannot be excluded from themselves")
+
+    if not await storage.groups.set_exclusions(group_id, [(p.user_id, p.other_user_id) for p in pairs]):
+        raise HTTPException(status_code=404, detail="Group not found")
+    return pairs
 
 
 @router.get("/{group_id}/rounds", response_model=List[Round])
-async def list_rounds(group_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
-    """List all rounds in a group"""
-    rounds_col = db["rounds"]
-    items = []
-    async for r in rounds_col.find({"group_id": group_id}).sort("created_at", -1):
-        r["_id"] = str(r["_id"])
-        items.append(Round(**r))
-    return items
+async def list_rounds(
+    group_id: str,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    storage: Storage = Depends(get_storage),
+):
+    """List rounds in a group, newest first, archived rounds included"""
+    after = decode_created_at_cursor(cursor)
+    if stream:
+        return ndjson_response(scan_rounds(storage, group_id, after), Round)
+    rounds = scan_rounds(storage, group_id, after, limit + 1)
+    return await paginate(rounds, Round, limit, response, cursor_of=created_at_cursor)
 
 
 @router.post("/{group_id}/rounds", response_model=Round)
-async def create_round(group_id: str, payload: RoundCreate, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def create_round(group_id: str, payload: RoundCreate, storage: Storage = Depends(get_storage)):
     """Start a new weekly round and assign random deeds to all members"""
-    groups_col = db["groups"]
-    rounds_col = db["rounds"]
-
     # Check group exists
-    group = await groups_col.find_one({"_id": ObjectId(group_id)})
+    group = await storage.groups.get(group_id)
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
 
     # Mark any active rounds as completed
-    await rounds_col.update_many(
-        {"group_id": group_id, "status": "active"},
-        {"$set": {"status": "completed"}}
-    )
+    previous = await storage.rounds.complete_active(group_id)
 
-    # Create new round
-    round_doc = {
-        "group_id": group_id,
-        "name": payload.name,
-        "status": "active",
-        "created_at": datetime.utcnow(),
-    }
-    res = await rounds_col.insert_one(round_doc)
-    round_id = str(res.inserted_id)
-    round_doc["_id"] = round_id
+    # Create new round and assign deeds to all members with target users
+    round_doc = await open_round(storage, group_id, payload.name, replaced=len(previous))
+    round_id = round_doc["_id"]
 
-    # Assign deeds to all members with target users
-    await assign_deeds_to_members(db, round_id, group_id)
+    for prev_id in previous:
+        round_events.publish(prev_id, ROUND_ADVANCED, {"round_id": prev_id, "new_round_id": round_id})
 
     return Round(**round_doc)
 
 
 @router.get("/{group_id}/current-round", response_model=Round)
-async def get_current_round(group_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def get_current_round(
+    group_id: str, request: Request, response: Response, storage: Storage = Depends(get_storage)
+):
     """Get the current active round for a group"""
-    rounds_col = db["rounds"]
-
-    rnd = await rounds_col.find_one({"group_id": group_id, "status": "active"})
+    rnd = await storage.rounds.get_active(group_id)
     if not rnd:
         raise HTTPException(status_code=404, detail="No active round found")
 
-    rnd["_id"] = str(rnd["_id"])
-    return Round(**rnd)
\ No newline at end of file
+    # The ETag names the round too, so advancing changes it
+    etag = round_etag(rnd["_id"], rnd.get("version", 0))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    return model_response(Round, rnd, etag_headers(etag, response))
+
+
+@router.get("/{group_id}/stats", response_model=RoundStats)
+async def get_group_stats(group_id: str, storage: Storage = Depends(get_storage)):
+    """Completion rates and times across all of a group's rounds, from its stats rollup"""
+    rollup = await storage.stats.get(group_id)
+    # No rollup until the group's first round; only then is a lookup needed
+    if rollup is None and not await storage.groups.get(group_id):
+        raise HTTPException(status_code=404, detail="Group not found")
+    return RoundStats(**summarize(rollup, group_id))
+
+
+async def _member_statuses(storage: Storage, round_id: str) -> Optional[List[dict]]:
+    rows = await storage.rounds.member_statuses(round_id)
+    return await user_directory.named(storage, rows) if rows is not None else None
+
+
+async def _none():
+    return None
+
+
+@router.get("/{group_id}/dashboard", response_model=GroupDashboard)
+async def get_group_dashboard(group_id: str, user_id: str = Query(None), storage: Storage = Depends(get_storage)):
+    """Everything the group page shows in one response: group, current round, statuses, completion and the user's deed"""
+    group, rnd = await asyncio.gather(storage.groups.get(group_id), storage.rounds.get_active(group_id))
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    if not rnd:
+        return GroupDashboard(group=group)
+
+    # Every read below hangs off the one active round document fetched above
+    round_id = rnd["_id"]
+    members, user_has_seen, deed = await asyncio.gather(
+        _member_statuses(storage, round_id),
+        storage.celebrations.has_seen(round_id, user_id) if user_id else _none(),
+        storage.deeds.get_for_user(round_id, user_id) if user_id else _none(),
+    )
+
+    return GroupDashboard(
+        group=group,
+        current_round=rnd,
+        members=members or [],
+        # An active round has no successor, so completion comes from its counters alone
+        completion=round_completion(rnd, bool(user_has_seen)),
+        my_deed=deed,
+    )
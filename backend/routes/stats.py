@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import APIRouter, Depends
+
+from main import get_storage
+from models import RoundStats
+from services.stats import summarize
+from storage.base import Storage
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("/", response_model=RoundStats)
+async def get_global_stats(storage: Storage = Depends(get_storage)):
+    """Completion rates and times across every group, from the global stats rollup"""
+    return RoundStats(**summarize(await storage.stats.get()))
@@ -3,84 +3,92 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from datetime import datetime
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 
-from main import get_db
+from main import get_storage
 from models import User, UserCreate, Group
+from services.bulk import NotAnArray, csv_rows, json_array_rows, ndjson_rows
+from services.invalidation import USERS, invalidator
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_id_cursor, ndjson_response, paginate
+from services.serialization import model_response, models_response
+from services.user_import import import_users
+from services.user_directory import user_directory
+from storage.base import Storage
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.get("/", response_model=List[User])
-async def list_users(db: AsyncIOMotorDatabase = Depends(get_db)):
-    """List all users"""
-    users_col = db["users"]
-    items = []
-    async for u in users_col.find():
-        u["_id"] = str(u["_id"])
-        items.append(User(**u))
-    return items
+async def list_users(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    storage: Storage = Depends(get_storage),
+):
+    """List users a page at a time, or every user as NDJSON with stream=true"""
+    after = decode_id_cursor(cursor)
+    if stream:
+        return ndjson_response(storage.users.scan(after), User)
+    return await paginate(storage.users.scan(after, limit + 1), User, limit, response)
 
 
 @router.post("/", response_model=User)
-async def create_user(payload: UserCreate, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def create_user(payload: UserCreate, storage: Storage = Depends(get_storage)):
     """Create a new user"""
-    users_col = db["users"]
-
     # Check if name already taken
-    existing = await users_col.find_one({"name": payload.name})
+    existing = await user_directory.get_by_name(storage, payload.name)
     if existing:
         raise HTTPException(status_code=400, detail="Name already taken")
 
-    doc = {
-        "name": payload.name,
-        "created_at": datetime.utcnow(),
-    }
-    res = await users_col.insert_one(doc)
-    doc["_id"] = str(res.inserted_id)
-    return User(**doc)
+    # A concurrent create can still take the name; the unique index decides
+    user = await storage.users.create(payload.name)
+    if user is None:
+        raise HTTPException(status_code=400, detail="Name already taken")
+    await invalidator.wrote(USERS, user["_id"])
+    user_directory.added(user)
+    return User(**user)
+
+
+@router.post("/import")
+async def import_users_and_memberships(request: Request, storage: Storage = Depends(get_storage)):
+    """Bulk-create users and join them to groups from CSV (text/csv), NDJSON (application/x-ndjson) or a JSON array"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("text/csv"):
+        rows = csv_rows(request.stream())
+    elif content_type.startswith("application/x-ndjson"):
+        rows = ndjson_rows(request.stream())
+    else:
+        rows = json_array_rows(request.stream())
+
+    # Every format is read a batch at a time, so memory stays flat for any file size
+    try:
+        return await import_users(storage, rows)
+    except NotAnArray:
+        raise HTTPException(status_code=400, detail="Body must be CSV, NDJSON or a JSON array")
 
 
 @router.get("/login/{name}", response_model=User)
-async def login(name: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def login(name: str, storage: Storage = Depends(get_storage)):
     """Login - get user by name"""
-    users_col = db["users"]
-    user = await users_col.find_one({"name": name})
+    user = await user_directory.get_by_name(storage, name)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    user["_id"] = str(user["_id"])
-    return User(**user)
+    return model_response(User, user)
 
 
 @router.get("/{user_id}", response_model=User)
-async def get_user(user_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def get_user(user_id: str, storage: Storage = Depends(get_storage)):
     """Get user by ID"""
-    users_col = db["users"]
-    user = await users_col.find_one({"_id": ObjectId(user_id)})
+    user = await user_directory.get(storage, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    user["_id"] = str(user["_id"])
-    return User(**user)
+    return model_response(User, user)
 
 
 @router.get("/{user_id}/groups", response_model=List[Group])
-async def get_user_groups(user_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def get_user_groups(user_id: str, storage: Storage = Depends(get_storage)):
     """Get all groups a user belongs to"""
-    members_col = db["group_members"]
-    groups_col = db["groups"]
-
-    memberships = members_col.find({"user_id": user_id})
-
-    groups = []
-    async for m in memberships:
-        group = await groups_col.find_one({"_id": ObjectId(m["group_id"])})
-        if group:
-            group["_id"] = str(group["_id"])
-            groups.append(Group(**group))
-
-    return groups
\ No newline at end of file
+    return models_response(Group, await storage.members.list_groups(user_id))
@@ -0,0 +1 @@
+# Empty file - just makes services a package
@@ -0,0 +1,103 @@
+"""Archival of long-completed rounds.
+
+Rounds completed more than ARCHIVE_AFTER_WEEKS ago move, with their deeds and
+celebration marks, out of `rounds`, `deeds` and `celebrations_seen` into
+`round_archive`: one compact document per round with its assignments
+embedded. The live collections, their indexes and the working set then only
+grow with recent rounds. Rounds move ARCHIVE_BATCH_SIZE at a time, oldest
+first, and each batch is safe to repeat if interrupted. `scan_rounds` reads
+a group's rounds across both tiers, so listings are unaffected.
+
+Run from backend/, e.g. daily from cron:
+    python -m services.archive                      # archive everything due
+    python -m services.archive --max-batches 10     # bound one run's work
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional, Tuple
+
+from storage.base import Storage
+
+ARCHIVE_AFTER_WEEKS = float(os.getenv("ARCHIVE_AFTER_WEEKS", "12"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "100"))
+
+
+async def _head(docs: AsyncIterator[dict]) -> Optional[dict]:
+    try:
+        return await docs.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def scan_rounds(
+    storage: Storage, group_id: str, after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None
+) -> AsyncIterator[dict]:
+    """A group's rounds across the live and archive tiers, newest first, after a `(created_at, _id)` cursor"""
+    tiers = [storage.rounds.scan_for_group(group_id, after, limit), storage.archive.scan_for_group(group_id, after, limit)]
+    # Both tiers are queried concurrently, then merged on the page order
+    heads = list(await asyncio.gather(*(_head(t) for t in tiers)))
+    yielded = 0
+    last_id = None
+    while any(heads):
+        i = max((i for i, doc in enumerate(heads) if doc), key=lambda i: (heads[i]["created_at"], heads[i]["_id"]))
+        rnd = heads[i]
+        heads[i] = await _head(tiers[i])
+        # A round caught mid-archive is in both tiers, back to back
+        if rnd["_id"] == last_id:
+            continue
+        last_id = rnd["_id"]
+        yield rnd
+        yielded += 1
+        if limit and yielded == limit:
+            return
+
+
+async def archive_completed(
+    storage: Storage,
+    weeks: float = ARCHIVE_AFTER_WEEKS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    max_batches: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> int:
+    """Archive every round completed more than `weeks` ago, a batch at a time; returns rounds archived"""
+    cutoff = (now or datetime.utcnow()) - timedelta(weeks=weeks)
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        batch = [r async for r in storage.rounds.scan_archivable(cutoff, batch_size)]
+        if not batch:
+            break
+        start = time.perf_counter()
+        moved = await storage.archive.archive(batch)
+        batches += 1
+        archived += moved
+        print(f"[archive] batch {batches}: {moved}/{len(batch)} round(s) archived in {time.perf_counter() - start:.2f}s")
+        if not moved:
+            break  # nothing left that this pass can move
+    return archived
+
+
+async def _run_cli(args):
+    from storage.factory import open_storage_from_env
+
+    storage = open_storage_from_env()
+    try:
+        archived = await archive_completed(storage, args.weeks, args.batch_size, args.max_batches)
+        print(f"Archived {archived} round(s)")
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive rounds completed more than N weeks ago")
+    parser.add_argument("--weeks", type=float, default=ARCHIVE_AFTER_WEEKS, help="archive rounds completed this long ago")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=None, help="stop after this many batches")
+    asyncio.run(_run_cli(parser.parse_args()))
@@ -0,0 +1,210 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import asyncio
+import os
+import random
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from services.template_cache import template_cache
+from services.template_sampler import TemplateSampler
+from services.user_directory import user_directory
+from storage.base import Storage
+
+# Nobody draws a target they had in their last this-many rounds, where the group allows
+PAIR_HISTORY_ROUNDS = int(os.getenv("PAIR_HISTORY_ROUNDS", "3"))
+# Random swaps tried per conflicting pair, and fresh shuffles per constraint set
+REPAIR_ATTEMPTS = 64
+ATTEMPTS_PER_TIER = 3
+
+# Fallback deeds - use {target} as placeholder
+DEFAULT_DEED_TEMPLATES = [
+    "Do something kind for {target} today",
+    "Give {target} a genuine compliment",
+    "Help {target} with a task without being asked",
+    "Buy {target} their favorite drink or snack",
+    "Write a thank you note to {target}",
+    "Send {target} an encouraging message",
+]
+
+
+async def load_members_with_names(storage: Storage, group_id: str) -> List[dict]:
+    """Get all group members with their user name; names come from the user directory"""
+    users = await user_directory.get_many(storage, await storage.members.list_user_ids(group_id))
+    return [{"user_id": u["_id"], "name": u["name"]} for u in users]
+
+
+async def load_deed_templates(storage: Storage) -> List[str]:
+    """Get every template description from the cache, falling back to the defaults"""
+    return await template_cache.descriptions(storage) or list(DEFAULT_DEED_TEMPLATES)
+
+
+def _constraints(*maps: Optional[Dict[str, Iterable[str]]]) -> Dict[str, Set[str]]:
+    merged: Dict[str, Set[str]] = {}
+    for m in maps:
+        for giver, targets in (m or {}).items():
+            merged.setdefault(giver, set()).update(targets)
+    return merged
+
+
+def _repair_cycle(order: List[str], forbidden: Dict[str, Set[str]]) -> bool:
+    """Swap members along the cycle until no giver is followed by a forbidden target.
+
+    Each bad edge is fixed by swapping its target with a random member, kept
+    only if all four edges it touches are allowed, so fixed edges stay
+    fixed. With sparse constraints conflicts are few and each fix takes a
+    constant expected number of tries, so one pass is linear.
+    """
+    n = len(order)
+
+    def allowed(i: int) -> bool:
+        giver, target = order[i % n], order[(i + 1) % n]
+        return target not in forbidden.get(giver, ())
+
+    for i in range(n):
+        if allowed(i):
+            continue
+        p = (i + 1) % n
+        for _ in range(REPAIR_ATTEMPTS):
+            j = random.randrange(n)
+            if j == p:
+                continue
+            order[p], order[j] = order[j], order[p]
+            if allowed(p - 1) and allowed(p) and allowed(j - 1) and allowed(j):
+                break
+            order[p], order[j] = order[j], order[p]
+        else:
+            return False
+    return True
+
+
+def _constrained_cycle(member_ids: List[str], forbidden: Dict[str, Set[str]]) -> Optional[List[str]]:
+    order = list(member_ids)
+    for _ in range(ATTEMPTS_PER_TIER):
+        random.shuffle(order)
+        if _repair_cycle(order, forbidden):
+            return order
+    return None
+
+
+def build_derangement(
+    member_ids: List[str],
+    excluded: Optional[Dict[str, Iterable[str]]] = None,
+    avoided: Optional[Dict[str, List[str]]] = None,
+) -> List[str]:
+    """Return a target for every member so nobody draws themselves.
+
+    Members are shuffled into a single random cycle, each giving to the
+    next, which is always a derangement. `excluded` targets (hard) and
+    `avoided` ones (soft: each giver's recent targets, newest first) are
+    then repaired away. If the constraints cannot be met the oldest avoided
+    targets are dropped first, then the exclusions, so a valid derangement
+    always comes back.
+    """
+    avoided = avoided or {}
+    depth = max((len(targets) for targets in avoided.values()), default=0)
+    tiers = (_constraints(excluded, {g: t[:k] for g, t in avoided.items()}) for k in range(depth, -1, -1))
+
+    order = None
+    for forbidden in tiers:
+        if forbidden:
+            order = _constrained_cycle(member_ids, forbidden)
+            if order:
+                break
+    if order is None:
+        order = list(member_ids)
+        random.shuffle(order)
+
+    target_of = {giver: order[(i + 1) % len(order)] for i, giver in enumerate(order)}
+    return [target_of[m] for m in member_ids]
+
+
+def build_deed_docs(
+    round_id: str,
+    members: List[dict],
+    drawn: List[str],
+    excluded: Optional[Dict[str, Iterable[str]]] = None,
+    avoided: Optional[Dict[str, List[str]]] = None,
+) -> List[dict]:
+    """Build one deed document per member, with `drawn` the template dealt to each, without touching the database"""
+    now = datetime.utcnow()
+
+    if len(members) < 2:
+        # Not enough members for Secret Santa style assignment
+        return [{
+            "round_id": round_id,
+            "user_id": member["user_id"],
+            "target_user_id": None,
+            "target_user_name": None,
+            "deed_description": template.replace("{target}", "someone"),
+            "completed": False,
+            "completed_at": None,
+            "created_at": now,
+        } for member, template in zip(members, drawn)]
+
+    # Each person gets assigned to do a deed for someone else
+    names = {m["user_id"]: m["name"] for m in members}
+    targets = build_derangement([m["user_id"] for m in members], excluded, avoided)
+
+    docs = []
+    for member, target_id, template in zip(members, targets, drawn):
+        target_name = names[target_id]
+        docs.append({
+            "round_id": round_id,
+            "user_id": member["user_id"],
+            "target_user_id": target_id,
+            "target_user_name": target_name,
+            "deed_description": template.replace("{target}", target_name),
+            "completed": False,
+            "completed_at": None,
+            "created_at": now,
+        })
+    return docs
+
+
+def exclusions_of(group: dict) -> Dict[str, Set[str]]:
+    """Member id -> members they must never draw; exclusion pairs apply both ways"""
+    excluded: Dict[str, Set[str]] = {}
+    for a, b in group.get("exclusions", ()):
+        excluded.setdefault(a, set()).add(b)
+        excluded.setdefault(b, set()).add(a)
+    return excluded
+
+
+async def assign_deeds_to_members(storage: Storage, round_id: str, group_id: str) -> List[dict]:
+    """Assign deeds to all group members, each targeting another member.
+
+    Avoids repeating anyone's targets from their last PAIR_HISTORY_ROUNDS
+    rounds and never pairs excluded members (unless the group is too small
+    to allow it). Templates are dealt by the group's TemplateSampler, whose
+    state rides on the group document. Costs three concurrent reads (group,
+    members and names, pair history), one read of the template pool
+    (skipped when cached), one insert_many, and the counter, pair history
+    and template heat writes together, regardless of group size.
+    """
+    group, members, history = await asyncio.gather(
+        storage.groups.get(group_id),
+        load_members_with_names(storage, group_id),
+        storage.pair_history.recent_targets(group_id),
+    )
+    if not members:
+        return []
+
+    group = group or {}
+    sampler = TemplateSampler(await load_deed_templates(storage), dict(group.get("template_heat", ())))
+    drawn = sampler.draw(len(members))
+
+    avoided = {giver: targets[:PAIR_HISTORY_ROUNDS] for giver, targets in history.items()}
+    docs = build_deed_docs(round_id, members, drawn, exclusions_of(group), avoided)
+    await storage.deeds.insert_many(docs)
+
+    pairs = [(d["user_id"], d["target_user_id"]) for d in docs if d["target_user_id"]]
+    await asyncio.gather(
+        storage.rounds.init_counters(round_id, len(docs)),
+        storage.pair_history.record(group_id, pairs, PAIR_HISTORY_ROUNDS),
+        storage.groups.set_template_heat(group_id, sampler.heat_after(drawn)),
+    )
+    return docs
@@ -0,0 +1,134 @@
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterator, List, NamedTuple, Optional, Tuple
+
+IMPORT_BATCH_SIZE = 500
+# Cap on per-row errors echoed back; the total is always reported
+MAX_REPORTED_ERRORS = 100
+# A JSON array element still unparsed at this length is taken as malformed
+# rather than buffered until the end of the body
+MAX_ARRAY_ELEMENT_CHARS = 64 * 1024
+
+
+class NotAnArray(ValueError):
+    """The body of a JSON array import does not start with `[`"""
+
+
+class Row(NamedTuple):
+    line: int
+    value: Any
+    error: Optional[str] = None
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """(line number, line) for every non-blank line of a byte stream"""
+    buffer = b""
+    line = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            line += 1
+            if raw.strip():
+                yield line, raw
+    if buffer.strip():
+        yield line + 1, buffer
+
+
+async def ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """Parse an NDJSON byte stream one line at a time; blank lines are skipped"""
+    async for line, raw in _lines(chunks):
+        yield _parse(line, raw)
+
+
+async def csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """Parse a UTF-8 CSV byte stream into dicts keyed by the header line, one record per line.
+
+    Empty cells are left out of the dict; blank lines are skipped.
+    """
+    header = None
+    async for line, raw in _lines(chunks):
+        try:
+            fields = next(csv.reader([raw.decode("utf-8-sig" if header is None else "utf-8").rstrip("\r")], strict=True))
+        except (UnicodeDecodeError, csv.Error) as e:
+            yield Row(line, None, f"Invalid CSV: {e}")
+            continue
+        if header is None:
+            header = [name.strip().lower() for name in fields]
+        elif len(fields) > len(header):
+            yield Row(line, None, f"Invalid CSV: expected at most {len(header)} fields, got {len(fields)}")
+        else:
+            yield Row(line, {name: value for name, value in zip(header, fields) if value != ""})
+
+
+def _parse(line: int, raw: bytes) -> Row:
+    try:
+        return Row(line, json.loads(raw))
+    except ValueError as e:
+        return Row(line, None, f"Invalid JSON: {e}")
+
+
+async def _with_end(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[bool, bytes]]:
+    async for chunk in chunks:
+        yield False, chunk
+    yield True, b""
+
+
+async def json_array_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """Parse a JSON array byte stream one element at a time, numbered from 1.
+
+    Raises NotAnArray before the first row if the body is not an array. A
+    syntax error part way through ends the rows with an error row, so the
+    elements before it are still imported, as with NDJSON.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    text = ""
+    expect = "["  # then "first" (a value or "]"), then "," or "]" after each value
+    line = 0
+    async for end, chunk in _with_end(chunks):
+        try:
+            text += utf8.decode(chunk, final=end)
+        except UnicodeDecodeError as e:
+            yield Row(line + 1, None, f"Invalid JSON: {e}")
+            return
+        while text := text.lstrip():
+            if expect == "[":
+                if text[0] != "[":
+                    raise NotAnArray("Body must be a JSON array")
+                text, expect = text[1:], "first"
+            elif expect in ("first", ",") and text[0] == "]":
+                return
+            elif expect == ",":
+                if text[0] != ",":
+                    yield Row(line + 1, None, "Invalid JSON: expected ',' or ']'")
+                    return
+                text, expect = text[1:], "value"
+            else:
+                try:
+                    value, stop = decoder.raw_decode(text)
+                except json.JSONDecodeError as e:
+                    if end or len(text) > MAX_ARRAY_ELEMENT_CHARS:
+                        yield Row(line + 1, None, f"Invalid JSON: {e}")
+                        return
+                    break  # the element continues in the next chunk
+                if stop == len(text) and not end:
+                    break  # a number or literal might, too
+                line += 1
+                yield Row(line, value)
+                text, expect = text[stop:], ","
+    if expect == "[":
+        raise NotAnArray("Body must be a JSON array")
+    yield Row(line + 1, None, "Invalid JSON: the array is not closed")
+
+
+async def batched(rows: AsyncIterator[Row], size: int = IMPORT_BATCH_SIZE) -> AsyncIterator[List[Row]]:
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,67 @@
+"""Materialized per-round completion counters.
+
+Each round document carries `total_members` (deeds assigned) and
+`completed_count` (deeds completed), so completion checks are a point read.
+The storage backends maintain them; see `RoundRepository`.
+
+Repair drifted counters from backend/:
+    python -m services.counters              # active rounds
+    python -m services.counters --all        # every round
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+from typing import Optional
+
+
+def is_round_complete(rnd: dict) -> bool:
+    """All assigned deeds are done, judged from the round's counters alone"""
+    total = rnd.get("total_members", 0)
+    return total > 0 and rnd.get("completed_count", 0) >= total
+
+
+def round_completion(rnd: dict, user_has_seen: bool, new_round_id: Optional[str] = None) -> dict:
+    """The check-complete payload for a round, given whether the user already saw its celebration"""
+    if rnd.get("status", "active") == "completed":
+        return {
+            "round_id": rnd["_id"],
+            "total_members": 0,
+            "completed_count": 0,
+            "all_complete": True,
+            "show_celebration": not user_has_seen,  # Show if user hasn't seen it
+            "round_completed": True,
+            "new_round_id": new_round_id,
+        }
+
+    all_complete = is_round_complete(rnd)
+    return {
+        "round_id": rnd["_id"],
+        "total_members": rnd.get("total_members", 0),
+        "completed_count": rnd.get("completed_count", 0),
+        "all_complete": all_complete,
+        # Show celebration if all complete AND user hasn't seen it yet
+        "show_celebration": all_complete and not user_has_seen,
+        "round_completed": False,
+        "new_round_id": None,
+    }
+
+
+async def _run_cli(only_active: bool):
+    from storage.factory import open_storage_from_env
+
+    storage = open_storage_from_env()
+    try:
+        repaired = await storage.rounds.reconcile_counters(only_active)
+        print(f"Repaired counters on {repaired} round(s)")
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repair round completion counters")
+    parser.add_argument("--all", action="store_true", help="include completed rounds")
+    asyncio.run(_run_cli(only_active=not parser.parse_args().all))
@@ -0,0 +1,41 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Every round document carries a `version` that its writers bump whenever
+# anything a round read returns can change: deeds assigned or completed, the
+# round advanced or completed, or its group's membership changed. The version
+# alone therefore identifies every representation of a round, so
+# revalidating costs a single point read. Routes with several representations
+# of one round (pages, formats, one per user) add a `variant` naming which.
+
+
+def round_etag(round_id: str, version: int, *variant) -> str:
+    if not variant:
+        return f'"{round_id}.{version}"'
+    digest = hashlib.blake2b(repr(variant).encode(), digest_size=8).hexdigest()
+    return f'"{round_id}.{version}.{digest}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix added by a proxy still matches
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
+
+
+def etag_headers(etag: str, response: Optional[Response] = None) -> dict:
+    """Validator headers for a 200; also applied to the injected `response` when given"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if response is not None:
+        response.headers.update(headers)
+    return headers
@@ -0,0 +1,63 @@
+import asyncio
+import json
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Optional, Set
+
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE_SECONDS = 15
+
+# Events buffered per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+MEMBER_COMPLETED = "member-completed"
+ROUND_COMPLETE = "round-complete"
+ROUND_ADVANCED = "round-advanced"
+
+
+class RoundEventBus:
+    """In-process pub/sub fan-out of round progress events.
+
+    Route handlers publish once per change; every stream subscribed to the
+    round gets its own bounded queue, so a slow client never blocks the
+    publisher or other subscribers.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscriber_count(self, round_id: str) -> int:
+        return len(self._subscribers.get(round_id, ()))
+
+    def publish(self, round_id: str, event: str, data: dict):
+        """Fan an event out to every subscriber of the round"""
+        message = (event, data)
+        for queue in self._subscribers.get(round_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def subscribe(self, round_id: str) -> AsyncIterator[Optional[tuple]]:
+        """Yield `(event, data)` tuples for a round, or None after an idle keep-alive interval"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[round_id].add(queue)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._subscribers[round_id].discard(queue)
+            if not self._subscribers[round_id]:
+                del self._subscribers[round_id]
+
+
+def format_sse(message: Optional[tuple]) -> str:
+    """Encode a bus message as a Server-Sent Events frame"""
+    if message is None:
+        return ": keep-alive\n\n"
+    event, data = message
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+round_events = RoundEventBus()
@@ -0,0 +1,141 @@
+"""Cross-worker invalidation of in-process caches.
+
+Caches subscribe to a collection and are told whenever a document in it
+changes, whichever worker wrote it. `CacheInvalidator.run` follows a change
+stream on the subscribed collections; where change streams are unavailable
+(a standalone mongod) it instead polls a shared version document that
+writers bump through `wrote()`. Each worker starts it in `lifespan`.
+
+Writers call `await invalidator.wrote(collection)` after a write, which
+invalidates this worker's caches straight away (so it reads its own writes)
+and, when polling, tells the other workers too.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+TEMPLATES = "deed_templates"
+USERS = "users"
+
+VERSIONS_COLLECTION = "cache_versions"
+VERSIONS_ID = "versions"
+
+CACHE_POLL_SECONDS = float(os.getenv("CACHE_POLL_SECONDS", "2"))
+# Pause before reopening a change stream that failed for a transient reason
+CHANGE_STREAM_RETRY_SECONDS = 1.0
+
+# Server error codes meaning change streams are not supported here
+_NO_CHANGE_STREAMS = {40573}  # "only supported on replica sets"
+
+# Called with the changed document's id, or None when anything in the collection may have changed
+Callback = Callable[[Optional[str]], None]
+
+
+class CacheInvalidator:
+    def __init__(self):
+        self._subscribers: Dict[str, List[Callback]] = {}
+        self._versions = None  # the version collection, once run() knows the database
+        self._streaming = False
+
+    def subscribe(self, collection: str, callback: Callback):
+        self._subscribers.setdefault(collection, []).append(callback)
+
+    def publish(self, collection: str, doc_id: Optional[str] = None):
+        """Invalidate this worker's caches of a collection"""
+        for callback in self._subscribers.get(collection, ()):
+            callback(doc_id)
+
+    def publish_all(self):
+        """Invalidate every cache, e.g. after missing changes while disconnected"""
+        for collection in self._subscribers:
+            self.publish(collection)
+
+    async def wrote(self, collection: str, doc_id: Optional[str] = None):
+        """Record a write made by this worker"""
+        self.publish(collection, doc_id)
+        await self._bump(collection)
+
+    async def wrote_many(self, collection: str, doc_ids: List[str]):
+        """Record a bulk write of these documents; other workers get one version bump for all of them"""
+        for doc_id in doc_ids:
+            self.publish(collection, doc_id)
+        await self._bump(collection)
+
+    async def _bump(self, collection: str):
+        # A change stream already carries the write to other workers, and
+        # collections nobody caches need no version
+        if self._versions is not None and not self._streaming and collection in self._subscribers:
+            await self._versions.update_one({"_id": VERSIONS_ID}, {"$inc": {collection: 1}}, upsert=True)
+
+    async def run(self, db: AsyncIOMotorDatabase, poll_interval: float = CACHE_POLL_SECONDS):
+        """Deliver other workers' writes to local caches until cancelled"""
+        self._versions = db[VERSIONS_COLLECTION]
+        if await self._watch(db):
+            return
+        print(f"[backend] Change streams unavailable; polling cache versions every {poll_interval}s")
+        await self._poll(poll_interval)
+
+    async def _watch(self, db: AsyncIOMotorDatabase) -> bool:
+        """Follow the change stream; False as soon as the server turns out not to support one"""
+        # Only collections some cache follows; other writes never leave the server
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": sorted(self._subscribers)}}},
+            {"$project": {"ns": 1, "documentKey": 1, "operationType": 1}},
+        ]
+        resume_token = None
+        while True:
+            try:
+                async with db.watch(pipeline, resume_after=resume_token) as stream:
+                    self._streaming = True
+                    # Writes between the last event seen and now were never delivered
+                    if resume_token is None:
+                        self.publish_all()
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        self._apply(change)
+            except OperationFailure as e:
+                if e.code in _NO_CHANGE_STREAMS:
+                    self._streaming = False
+                    return False
+                print(f"[backend] Change stream failed, reopening: {e}")
+                resume_token = None  # the token may be what the server rejected
+            except PyMongoError as e:
+                print(f"[backend] Change stream interrupted, resuming: {e}")
+            self._streaming = False
+            await asyncio.sleep(CHANGE_STREAM_RETRY_SECONDS)
+
+    def _apply(self, change: dict):
+        collection = change.get("ns", {}).get("coll")
+        if change["operationType"] in ("insert", "update", "replace", "delete"):
+            doc_id = change.get("documentKey", {}).get("_id")
+            self.publish(collection, str(doc_id) if doc_id is not None else None)
+        elif collection:
+            # drop, rename, ...: the whole collection is suspect
+            self.publish(collection)
+        else:
+            self.publish_all()
+
+    async def _poll(self, interval: float):
+        seen = None
+        while True:
+            try:
+                doc = await self._versions.find_one({"_id": VERSIONS_ID}) or {}
+                if seen is not None:
+                    for collection in self._subscribers:
+                        if doc.get(collection) != seen.get(collection):
+                            self.publish(collection)
+                seen = doc
+            except PyMongoError as e:
+                print(f"[backend] Cache version poll failed: {e}")
+            await asyncio.sleep(interval)
+
+
+invalidator = CacheInvalidator()
@@ -0,0 +1,222 @@
+"""Prometheus metrics for HTTP requests and the Mongo commands they issue.
+
+MetricsMiddleware times every request under its route template (e.g.
+`/rounds/{round_id}/status`); streaming responses (SSE, NDJSON) count their
+time to first byte as latency and their whole connection separately. It marks that route as active for the rest of
+the request. The Mongo listeners read the active route, so each command is
+counted against the endpoint that issued it; commands issued outside a
+request (scheduler, migrations) are labelled `background`. Motor runs
+commands on executor threads but copies the caller's context, so the route
+follows them there.
+
+Scrape GET /metrics. With several worker processes, set
+PROMETHEUS_MULTIPROC_DIR so the endpoint aggregates all of them.
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+BACKGROUND = "background"
+# Requests that match no route share one label, so scanners cannot blow up cardinality
+UNMATCHED = "unmatched"
+# Responses that stay open while they stream, so their duration is not request latency
+STREAMING_CONTENT_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+current_route: ContextVar[str] = ContextVar("current_route", default=BACKGROUND)
+# Durations of the Mongo commands issued by the current request
+_request_commands: ContextVar[Optional[List[float]]] = ContextVar("request_commands", default=None)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status code", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route"]
+)
+HTTP_STREAM_DURATION = Histogram(
+    "http_stream_duration_seconds", "How long streaming responses stay open, by route", ["method", "route"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0),
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ["method", "route"],
+    multiprocess_mode="livesum",
+)
+MONGO_COMMANDS = Counter(
+    "mongo_commands_total", "Mongo commands by issuing route, command and outcome", ["route", "command", "status"]
+)
+MONGO_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "Mongo command latency by issuing route", ["route", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+MONGO_COMMANDS_PER_REQUEST = Histogram(
+    "mongo_commands_per_request", "Mongo commands issued while serving one request", ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongo_pool_connections", "Open connections in the Mongo pool", ["address"], multiprocess_mode="livesum"
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "mongo_pool_checked_out", "Mongo connections currently checked out", ["address"], multiprocess_mode="livesum"
+)
+MONGO_POOL_MAX_SIZE = Gauge(
+    "mongo_pool_max_size", "Configured maximum size of the Mongo pool", ["address"], multiprocess_mode="max"
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total", "Failed Mongo connection checkouts by reason", ["address", "reason"]
+)
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Counts and times every Mongo command against the route that issued it"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "failed")
+
+    def _record(self, event, status: str):
+        seconds = event.duration_micros / 1e6
+        route = current_route.get()
+        MONGO_COMMANDS.labels(route, event.command_name, status).inc()
+        MONGO_LATENCY.labels(route, event.command_name).observe(seconds)
+        commands = _request_commands.get()
+        if commands is not None:
+            commands.append(seconds)  # list.append is atomic, and executor threads share the list
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool gauges per server address"""
+
+    def pool_created(self, event):
+        MONGO_POOL_MAX_SIZE.labels(_address(event)).set(event.options.get("maxPoolSize", 100))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.labels(_address(event), str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(_address(event)).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(_address(event)).dec()
+
+
+def mongo_event_listeners() -> list:
+    """Listeners to pass as `event_listeners` when creating the app's Mongo client"""
+    return [MongoCommandMetrics(), MongoPoolMetrics()]
+
+
+def is_streaming(headers: List[tuple]) -> bool:
+    """Whether ASGI response headers mark a streaming (SSE or NDJSON) response"""
+    content_type = next((value for name, value in headers if name.lower() == b"content-type"), b"")
+    return content_type.startswith(STREAMING_CONTENT_TYPES)
+
+
+def route_template(app: ASGIApp, scope: Scope) -> str:
+    """The path template of the route a request will be dispatched to"""
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and status codes per route"""
+
+    def __init__(self, app: ASGIApp, routes_from: ASGIApp):
+        self.app = app
+        # The application whose routes define the labels; middleware wraps it
+        self.routes_from = routes_from
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(self.routes_from, scope)
+        status = 500  # unless the app gets as far as starting a response
+        first_byte = None  # when a streaming response started
+
+        async def send_with_status(message: Message):
+            nonlocal status, first_byte
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if is_streaming(message.get("headers", [])):
+                    first_byte = time.perf_counter()
+            await send(message)
+
+        route_token = current_route.set(route)
+        commands_token = _request_commands.set([])
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            end = time.perf_counter()
+            if first_byte is None:
+                HTTP_LATENCY.labels(method, route).observe(end - start)
+            else:
+                # A stream can stay open for minutes; only its start is request latency
+                HTTP_LATENCY.labels(method, route).observe(first_byte - start)
+                HTTP_STREAM_DURATION.labels(method, route).observe(end - start)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+            MONGO_COMMANDS_PER_REQUEST.labels(method, route).observe(len(_request_commands.get()))
+            in_flight.dec()
+            _request_commands.reset(commands_token)
+            current_route.reset(route_token)
+
+
+def metrics_response(_: Request) -> Response:
+    """Prometheus text exposition of every metric, across worker processes when configured"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
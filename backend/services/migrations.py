@@ -0,0 +1,368 @@
+"""Versioned index bootstrap and schema migrations.
+
+Runs from the app lifespan on startup, or by hand from backend/:
+    python -m services.migrations upgrade    # apply pending migrations
+    python -m services.migrations status     # show applied schema version
+    python -m services.migrations coverage   # list route queries without an index
+    python -m services.migrations convert-refs  # rewrite hex-string references left by old workers
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Sequence, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from storage.mongo import MongoRoundRepository
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+# One lease document; whoever holds it runs the migrations while other workers wait
+MIGRATION_LOCK_COLLECTION = "schema_migrations_lock"
+MIGRATION_LOCK_ID = "migrations"
+# Renewed after every migration; a worker that dies holding it blocks the others this long at most
+MIGRATION_LOCK_SECONDS = 600
+MIGRATION_LOCK_POLL_SECONDS = 1.0
+
+# Reference fields stored as ObjectId from schema version 8; older documents hold hex strings
+OBJECT_ID_REFERENCES: Dict[str, Tuple[str, ...]] = {
+    "group_members": ("group_id", "user_id"),
+    "rounds": ("group_id",),
+    "deeds": ("round_id", "user_id"),
+    "round_archive": ("group_id",),
+}
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[AsyncIOMotorDatabase], Awaitable[None]]
+
+
+class QueryShape(NamedTuple):
+    route: str
+    collection: str
+    equality: Tuple[str, ...]
+    sort: Tuple[str, ...] = ()
+
+
+class MigrationError(Exception):
+    pass
+
+
+def _duplicates_pipeline(keys: List[str], prefer: Sequence[Tuple[str, int]]) -> List[dict]:
+    # `ids` lists each key combination's documents best first: by `prefer`, then oldest
+    return [
+        {"$sort": dict([*prefer, ("_id", ASCENDING)])},
+        {"$group": {
+            # Compared as strings, so a hex reference and its ObjectId count as one
+            "_id": {k: {"$toString": f"${k}"} for k in keys},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+
+
+async def drop_duplicates(
+    db: AsyncIOMotorDatabase, collection: str, keys: List[str], prefer: Sequence[Tuple[str, int]] = ()
+):
+    """Keep one document per key combination, the first by `prefer` or else the oldest, so a unique index can be built"""
+    extra_ids = []
+    async for dup in db[collection].aggregate(_duplicates_pipeline(keys, prefer), allowDiskUse=True):
+        extra_ids.extend(dup["ids"][1:])
+    if extra_ids:
+        await db[collection].delete_many({"_id": {"$in": extra_ids}})
+
+
+async def refuse_duplicates(db: AsyncIOMotorDatabase, collection: str, keys: List[str], fix: str):
+    """Fail with every duplicate key combination listed, for duplicates that cannot be dropped safely"""
+    dups = [dup async for dup in db[collection].aggregate(_duplicates_pipeline(keys, []), allowDiskUse=True)]
+    if dups:
+        listed = "; ".join(f"{dup['_id']} x{dup['count']} ({', '.join(map(str, dup['ids']))})" for dup in dups)
+        raise MigrationError(f"{len(dups)} duplicate {collection} {keys} combinations; {fix}: {listed}")
+
+
+async def create_core_indexes(db: AsyncIOMotorDatabase):
+    # Membership and celebration marks are idempotent, so duplicates are safe to drop
+    await drop_duplicates(db, "group_members", ["group_id", "user_id"])
+    await drop_duplicates(db, "celebrations_seen", ["round_id", "user_id"])
+    # A racy join could assign a member twice; keep the deed they completed, if any
+    await drop_duplicates(db, "deeds", ["round_id", "user_id"], prefer=[("completed", DESCENDING)])
+    # Users sharing a name may each own memberships and deeds, so only a person can merge them
+    await refuse_duplicates(db, "users", ["name"], "rename or merge these users, then restart")
+
+    await db["users"].create_indexes([
+        IndexModel([("name", ASCENDING)], unique=True, name="name_unique"),
+    ])
+    await db["group_members"].create_indexes([
+        IndexModel([("group_id", ASCENDING), ("user_id", ASCENDING)], unique=True, name="group_user_unique"),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+    ])
+    await db["rounds"].create_indexes([
+        IndexModel([("group_id", ASCENDING), ("status", ASCENDING)], name="group_status"),
+        IndexModel([("group_id", ASCENDING), ("created_at", DESCENDING)], name="group_created_at"),
+    ])
+    await db["deeds"].create_indexes([
+        IndexModel([("round_id", ASCENDING), ("user_id", ASCENDING)], unique=True, name="round_user_unique"),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+    ])
+    await db["celebrations_seen"].create_indexes([
+        IndexModel([("round_id", ASCENDING), ("user_id", ASCENDING)], unique=True, name="round_user_unique"),
+    ])
+
+
+async def backfill_round_counters(db: AsyncIOMotorDatabase):
+    await MongoRoundRepository(db).reconcile_counters(only_active=True)
+
+
+async def create_pagination_indexes(db: AsyncIOMotorDatabase):
+    # Keyset pages sort on a unique tiebreak, so the index has to carry `_id` too
+    await db["rounds"].create_indexes([
+        IndexModel(
+            [("group_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="group_created_at_id",
+        ),
+    ])
+    # An earlier attempt that failed further on may have dropped it already
+    if "group_created_at" in await db["rounds"].index_information():
+        await db["rounds"].drop_index("group_created_at")
+    await db["deeds"].create_indexes([
+        IndexModel([("round_id", ASCENDING), ("_id", ASCENDING)], name="round_id_id"),
+    ])
+
+
+async def create_rotation_index(db: AsyncIOMotorDatabase):
+    await db["rounds"].create_indexes([
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="status_created_at_id"),
+    ])
+
+
+async def create_template_description_index(db: AsyncIOMotorDatabase):
+    # Deeds copy the description text, so dropping a duplicate template loses nothing
+    await drop_duplicates(db, "deed_templates", ["description"])
+    await db["deed_templates"].create_indexes([
+        IndexModel([("description", ASCENDING)], unique=True, name="description_unique"),
+    ])
+
+
+async def create_pair_history_index(db: AsyncIOMotorDatabase):
+    await db["pair_history"].create_indexes([
+        IndexModel([("group_id", ASCENDING)], name="group_id"),
+    ])
+
+
+async def create_archive_index(db: AsyncIOMotorDatabase):
+    # Same keyset order as live rounds, so GET /groups/{id}/rounds can merge the tiers
+    await db["round_archive"].create_indexes([
+        IndexModel(
+            [("group_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="group_created_at_id",
+        ),
+    ])
+
+
+async def convert_references(db: AsyncIOMotorDatabase) -> int:
+    """Rewrite hex-string references as ObjectId; safe to re-run while old workers still write strings"""
+    # An old worker can add a membership a new worker already stored typed
+    await drop_duplicates(db, "group_members", ["group_id", "user_id"])
+    converted = 0
+    for collection, fields in OBJECT_ID_REFERENCES.items():
+        for field in fields:
+            # Server-side, no round trips; a string that is not an id is left as it is
+            res = await db[collection].update_many(
+                {field: {"$type": "string"}},
+                [{"$set": {field: {"$convert": {"input": f"${field}", "to": "objectId", "onError": f"${field}"}}}}],
+            )
+            converted += res.modified_count
+    return converted
+
+
+# Append new migrations at the end; versions must keep increasing
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Core indexes for members, rounds, deeds, celebrations and user names", create_core_indexes),
+    Migration(2, "Backfill completion counters on active rounds", backfill_round_counters),
+    Migration(3, "Keyset pagination indexes for rounds and deeds", create_pagination_indexes),
+    Migration(4, "Unique deed template descriptions", create_template_description_index),
+    Migration(5, "Index active rounds by age for scheduled rotation", create_rotation_index),
+    Migration(6, "Index assignment pair history by group", create_pair_history_index),
+    Migration(7, "Keyset pagination index for archived rounds", create_archive_index),
+    Migration(8, "Store member, round and deed references as ObjectId", convert_references),
+]
+
+
+# Every filter/sort the routes issue, checked by `coverage_report`
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("POST /users/", "users", ("name",)),
+    QueryShape("GET /users/login/{name}", "users", ("name",)),
+    QueryShape("POST /users/import", "users", ("name",)),
+    QueryShape("POST /users/import", "group_members", ("group_id", "user_id")),
+    QueryShape("GET /users/{user_id}/groups", "group_members", ("user_id",)),
+    QueryShape("POST /groups/{group_id}/join", "group_members", ("group_id", "user_id")),
+    QueryShape("GET /groups/{group_id}/members", "group_members", ("group_id",)),
+    QueryShape("GET /groups/{group_id}/rounds", "rounds", ("group_id",), ("created_at", "_id")),
+    QueryShape("GET /groups/{group_id}/rounds", "round_archive", ("group_id",), ("created_at", "_id")),
+    QueryShape("POST /groups/{group_id}/rounds", "rounds", ("group_id", "status")),
+    QueryShape("GET /groups/{group_id}/current-round", "rounds", ("group_id", "status")),
+    QueryShape("GET /groups/{group_id}/dashboard", "rounds", ("group_id", "status")),
+    QueryShape("GET /groups/{group_id}/dashboard", "group_members", ("group_id",)),
+    QueryShape("GET /groups/{group_id}/dashboard", "deeds", ("round_id", "user_id")),
+    QueryShape("GET /groups/{group_id}/dashboard", "celebrations_seen", ("round_id", "user_id")),
+    QueryShape("GET /rounds/{round_id}/status", "group_members", ("group_id",)),
+    QueryShape("GET /rounds/{round_id}/status", "deeds", ("round_id", "user_id")),
+    QueryShape("GET /rounds/{round_id}/check-complete", "celebrations_seen", ("round_id", "user_id")),
+    QueryShape("GET /rounds/{round_id}/check-complete", "rounds", ("group_id", "status")),
+    QueryShape("POST /rounds/{round_id}/advance", "group_members", ("group_id",)),
+    QueryShape("POST /rounds/{round_id}/celebration-seen", "celebrations_seen", ("round_id", "user_id")),
+    QueryShape("GET /rounds/{round_id}/my-deed", "deeds", ("round_id", "user_id")),
+    QueryShape("POST /rounds/{round_id}/complete", "deeds", ("round_id", "user_id")),
+    QueryShape("GET /rounds/{round_id}/deeds", "deeds", ("round_id",), ("_id",)),
+    QueryShape("POST /deeds/seed", "deed_templates", ("description",)),
+    QueryShape("assignment: pair history", "pair_history", ("group_id",)),
+    QueryShape("scheduler: due rounds", "rounds", ("status",), ("created_at", "_id")),
+    QueryShape("archiver: archivable rounds", "rounds", ("status",), ("created_at", "_id")),
+    QueryShape("archiver: deeds", "deeds", ("round_id",)),
+    QueryShape("archiver: celebrations", "celebrations_seen", ("round_id",)),
+    QueryShape("POST /deeds/templates", "deed_templates", ("description",)),
+    QueryShape("POST /deeds/templates/import", "deed_templates", ("description",)),
+]
+
+
+async def get_schema_version(db: AsyncIOMotorDatabase) -> int:
+    """Highest migration version recorded in the database, 0 if none"""
+    latest = await db[MIGRATIONS_COLLECTION].find_one(sort=[("_id", DESCENDING)])
+    return latest["_id"] if latest else 0
+
+
+async def _take_lock(db: AsyncIOMotorDatabase, owner: str) -> bool:
+    """Take or renew the migration lease; False while another worker holds an unexpired one"""
+    now = datetime.utcnow()
+    try:
+        await db[MIGRATION_LOCK_COLLECTION].update_one(
+            {"_id": MIGRATION_LOCK_ID, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=MIGRATION_LOCK_SECONDS)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The lease exists and is someone else's, so the upsert's insert lost
+        return False
+    return True
+
+
+async def _release_lock(db: AsyncIOMotorDatabase, owner: str):
+    await db[MIGRATION_LOCK_COLLECTION].delete_one({"_id": MIGRATION_LOCK_ID, "owner": owner})
+
+
+async def apply_migrations(db: AsyncIOMotorDatabase) -> List[int]:
+    """Apply every pending migration in order and record each one as it succeeds.
+
+    Workers starting together take turns through a lease, so each migration
+    runs once; the others find it recorded when their turn comes.
+    """
+    owner = uuid.uuid4().hex
+    if not await _take_lock(db, owner):
+        print("[migrations] Another worker is migrating; waiting for it")
+        while not await _take_lock(db, owner):
+            await asyncio.sleep(MIGRATION_LOCK_POLL_SECONDS)
+
+    applied = []
+    try:
+        # Read under the lease: whoever held it before may have applied everything
+        current = await get_schema_version(db)
+        for migration in MIGRATIONS:
+            if migration.version <= current:
+                continue
+            try:
+                await migration.apply(db)
+            except Exception as e:
+                # Later migrations may depend on this one, so nothing after it runs
+                raise MigrationError(f"Migration {migration.version} ({migration.description}) failed: {e}") from e
+            try:
+                await db[MIGRATIONS_COLLECTION].insert_one({
+                    "_id": migration.version,
+                    "description": migration.description,
+                    "applied_at": datetime.utcnow(),
+                })
+                applied.append(migration.version)
+            except DuplicateKeyError:
+                # Our lease expired mid-migration and its new holder recorded it first
+                pass
+            await _take_lock(db, owner)
+    finally:
+        await _release_lock(db, owner)
+    return applied
+
+
+def index_coverage(shape: QueryShape, index_keys: List[List[str]]) -> str:
+    """Classify a query shape as "full", "partial" or "none" against a list of index key paths"""
+    if shape.equality == ("_id",):
+        return "full"
+
+    wanted = set(shape.equality)
+    best = "none"
+    for keys in index_keys:
+        prefix = keys[:len(wanted)]
+        if set(prefix) == wanted and tuple(keys[len(wanted):len(wanted) + len(shape.sort)]) == shape.sort:
+            return "full"
+        if keys and keys[0] in wanted:
+            best = "partial"
+    return best
+
+
+async def coverage_report(db: AsyncIOMotorDatabase) -> List[dict]:
+    """Check every registered route query against the indexes that exist right now"""
+    indexes: Dict[str, List[List[str]]] = {}
+    report = []
+    for shape in QUERY_SHAPES:
+        if shape.collection not in indexes:
+            info = await db[shape.collection].index_information()
+            indexes[shape.collection] = [[field for field, _ in idx["key"]] for idx in info.values()]
+        report.append({
+            "route": shape.route,
+            "collection": shape.collection,
+            "filter": list(shape.equality),
+            "sort": list(shape.sort),
+            "coverage": index_coverage(shape, indexes[shape.collection]),
+        })
+    return report
+
+
+async def _run_cli(command: str):
+    from storage.factory import open_storage_from_env
+
+    storage = open_storage_from_env()
+    if storage.kind != "mongo":
+        raise SystemExit("Migrations only apply to the mongo storage backend")
+
+    db = storage.db
+    try:
+        if command == "upgrade":
+            try:
+                applied = await apply_migrations(db)
+            except MigrationError as e:
+                raise SystemExit(str(e))
+            print(f"Applied migrations: {applied or 'none'}")
+        if command in ("upgrade", "status"):
+            latest = MIGRATIONS[-1].version
+            print(f"Schema version: {await get_schema_version(db)} (latest {latest})")
+        elif command == "coverage":
+            for row in await coverage_report(db):
+                if row["coverage"] != "full":
+                    print(f"{row['coverage']:>8}  {row['route']}  {row['collection']} {row['filter']} sort={row['sort']}")
+        elif command == "convert-refs":
+            print(f"Converted references: {await convert_references(db)}")
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Secret Santa schema migrations")
+    parser.add_argument("command", choices=["upgrade", "status", "coverage", "convert-refs"])
+    asyncio.run(_run_cli(parser.parse_args().command))
@@ -0,0 +1,96 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import base64
+import json
+from datetime import datetime
+from typing import AsyncIterator, Callable, Optional, Tuple, Type
+
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from services.serialization import dump_line, models_response
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    """Opaque, URL-safe cursor for the sort key of the last item on a page"""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def id_cursor(doc: dict) -> str:
+    return encode_cursor(doc["_id"])
+
+
+def decode_id_cursor(cursor: Optional[str]) -> Optional[str]:
+    """`_id` to resume after, for collections paged in `_id` order"""
+    if not cursor:
+        return None
+    values = decode_cursor(cursor)
+    if len(values) != 1 or not isinstance(values[0], str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values[0]
+
+
+def created_at_cursor(doc: dict) -> str:
+    return encode_cursor(doc["created_at"], doc["_id"])
+
+
+def decode_created_at_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    """(created_at, _id) to resume after, for collections paged newest first"""
+    if not cursor:
+        return None
+    values = decode_cursor(cursor)
+    try:
+        created_at, doc_id = values
+        return datetime.fromisoformat(created_at), doc_id
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def paginate(
+    docs: AsyncIterator[dict],
+    model: Type[BaseModel],
+    limit: int,
+    response: Response,
+    cursor_of: Callable[[dict], str] = id_cursor,
+    headers: Optional[dict] = None,
+):
+    """Build one page from an iterator asked for `limit + 1` docs; sets the next-page cursor header"""
+    page = []
+    headers = dict(headers or {})
+    async for doc in docs:
+        if len(page) == limit:
+            headers[NEXT_CURSOR_HEADER] = cursor_of(page[-1])
+            break
+        page.append(doc)
+    response.headers.update(headers)
+    return models_response(model, page, headers)
+
+
+def ndjson_response(docs: AsyncIterator[dict], model: Type[BaseModel], headers: Optional[dict] = None) -> StreamingResponse:
+    """Serialize documents one line at a time as they come off the cursor"""
+    async def lines():
+        async for doc in docs:
+            yield dump_line(model, doc)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
@@ -0,0 +1,151 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from bson import ObjectId
+
+from services.assignment import assign_deeds_to_members
+from services.events import ROUND_ADVANCED, round_events
+from services.stats import record_round_opened
+from storage.base import Storage
+
+# How long a caller that lost the advance race waits for the winner (possibly
+# on another worker) to create the next round
+ADVANCE_WAIT_SECONDS = float(os.getenv("ADVANCE_WAIT_SECONDS", "5"))
+ADVANCE_POLL_SECONDS = 0.05
+
+# round_id -> the advance currently running in this process
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def next_round_name(now: Optional[datetime] = None) -> str:
+    """Rounds are named for the week they run into, e.g. "Week of Dec 16\""""
+    next_week = (now or datetime.utcnow()) + timedelta(days=7)
+    return "Week of " + next_week.strftime("%b %d")
+
+
+async def open_round(
+    storage: Storage, group_id: str, name: str, round_id: Optional[str] = None, replaced: int = 0
+) -> Optional[dict]:
+    """Create an active round and assign deeds to every member; `replaced` counts the rounds it ended.
+
+    None if `round_id` is already taken: someone else opened that round.
+    """
+    doc = {
+        "group_id": group_id,
+        "name": name,
+        "status": "active",
+        "total_members": 0,
+        "completed_count": 0,
+        "version": 0,
+        "created_at": datetime.utcnow(),
+    }
+    if round_id:
+        doc["_id"] = round_id
+    round_doc = await storage.rounds.create(doc)
+    if round_doc is None:
+        return None
+    deeds = await assign_deeds_to_members(storage, round_doc["_id"], group_id)
+    await record_round_opened(storage, group_id, len(deeds), rounds_completed=replaced)
+    return round_doc
+
+
+async def advance_round(storage: Storage, rnd: dict) -> Optional[dict]:
+    """Complete a round and open the next one; None if another advancer claimed it first"""
+    # Compare-and-set on the round's status: exactly one caller across all
+    # workers wins, and the successor's id is recorded for the losers
+    next_round_id = str(ObjectId())
+    if not await storage.rounds.claim_advance(rnd["_id"], rnd["status"], next_round_id):
+        return None
+
+    # Rounds are counted as ended by the open_round that replaces them, so an
+    # orphan (whose replacement crashed before counting it) is counted here too
+    new_round = await open_round(storage, rnd["group_id"], next_round_name(), next_round_id, replaced=1)
+    if new_round is None:
+        # We were slow enough that `reopen_successor` created it for us
+        return await storage.rounds.get(next_round_id)
+    round_events.publish(rnd["_id"], ROUND_ADVANCED, {"round_id": rnd["_id"], "new_round_id": new_round["_id"]})
+    return new_round
+
+
+async def successor(storage: Storage, round_id: str, wait: float = ADVANCE_WAIT_SECONDS) -> Optional[dict]:
+    """The round that replaced a completed one, waiting briefly if its advancer has not created it yet"""
+    deadline = time.monotonic() + wait
+    while True:
+        rnd = await storage.rounds.get(round_id) or await storage.archive.get(round_id)
+        if rnd is None:
+            return None
+        next_round_id = rnd.get("next_round_id")
+        if not next_round_id:
+            # Completed by POST /groups/{id}/rounds, which records no successor
+            return await storage.rounds.get_active(rnd["group_id"])
+
+        new_round = await storage.rounds.get(next_round_id)
+        if new_round or time.monotonic() >= deadline:
+            return new_round
+        await asyncio.sleep(ADVANCE_POLL_SECONDS)
+
+
+async def reopen_successor(storage: Storage, round_id: str) -> Optional[dict]:
+    """Open the successor a completed round reserved but whose advancer died before creating it"""
+    rnd = await storage.rounds.get(round_id)
+    if rnd is None or not rnd.get("next_round_id"):
+        return None
+    # The group moved on some other way, e.g. POST /groups/{id}/rounds
+    active = await storage.rounds.get_active(rnd["group_id"])
+    if active:
+        return active
+
+    # Under the reserved id, so a concurrent repair or the late advancer
+    # itself loses on the insert instead of opening a second round. Only the
+    # insert's winner counts the claimed round as ended, and the dead
+    # advancer never got that far.
+    new_round = await open_round(storage, rnd["group_id"], next_round_name(), rnd["next_round_id"], replaced=1)
+    if new_round is None:
+        return await storage.rounds.get(rnd["next_round_id"])
+    round_events.publish(round_id, ROUND_ADVANCED, {"round_id": round_id, "new_round_id": new_round["_id"]})
+    return new_round
+
+
+async def _advance(storage: Storage, round_id: str) -> Optional[dict]:
+    rnd = await storage.rounds.get(round_id)
+    if not rnd:
+        raise LookupError(round_id)
+
+    # A completed round with no successor and no active round to hand back
+    # (e.g. its advancer died) is advanced again
+    orphaned = (
+        rnd["status"] != "active"
+        and not rnd.get("next_round_id")
+        and not await storage.rounds.get_active(rnd["group_id"])
+    )
+    if rnd["status"] == "active" or orphaned:
+        new_round = await advance_round(storage, rnd)
+        if new_round:
+            return new_round
+
+    # A successor still missing after the wait means its advancer died
+    # between claiming the round and creating it
+    return await successor(storage, round_id) or await reopen_successor(storage, round_id)
+
+
+async def advance_once(storage: Storage, round_id: str) -> Optional[dict]:
+    """Advance a round, coalescing concurrent calls for it in this process onto one shared attempt.
+
+    Returns the next round (whoever created it), or None if the winner did not
+    create it in time. Raises LookupError if the round does not exist.
+    """
+    task = _inflight.get(round_id)
+    if task is None:
+        task = asyncio.ensure_future(_advance(storage, round_id))
+        _inflight[round_id] = task
+        task.add_done_callback(lambda _: _inflight.pop(round_id, None))
+    # Shielded so one caller disconnecting does not cancel the others' result
+    return await asyncio.shield(task)
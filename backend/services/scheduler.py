@@ -0,0 +1,166 @@
+"""Scheduled weekly round rotation.
+
+Finds active rounds older than the rotation period and advances them in
+batches, each batch running through a bounded pool of concurrent workers.
+Every group gets its own timeout, so one slow group only costs its own slot,
+and every batch records its timing and failures. Advancing is a
+compare-and-set on the round's status, so any number of schedulers, workers
+and user clicks can race safely.
+
+Runs in-process when RUN_SCHEDULER=true, or as a worker from backend/:
+    python -m services.scheduler              # poll forever
+    python -m services.scheduler --once       # one pass, then exit
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+from services.rotation import advance_round
+from storage.base import Storage
+
+ROUND_ROTATION_DAYS = float(os.getenv("ROUND_ROTATION_DAYS", "7"))
+SCHEDULER_INTERVAL_SECONDS = float(os.getenv("SCHEDULER_INTERVAL_SECONDS", "300"))
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "16"))
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "200"))
+SCHEDULER_GROUP_TIMEOUT_SECONDS = float(os.getenv("SCHEDULER_GROUP_TIMEOUT_SECONDS", "30"))
+
+
+class BatchReport(NamedTuple):
+    batch: int
+    groups: int
+    advanced: int
+    skipped: int  # already advanced by someone else
+    failures: List[Tuple[str, str]]  # (group_id, error)
+    seconds: float
+
+
+class Scheduler:
+    def __init__(
+        self,
+        storage: Storage,
+        period: timedelta = timedelta(days=ROUND_ROTATION_DAYS),
+        concurrency: int = SCHEDULER_CONCURRENCY,
+        batch_size: int = SCHEDULER_BATCH_SIZE,
+        group_timeout: float = SCHEDULER_GROUP_TIMEOUT_SECONDS,
+    ):
+        self.storage = storage
+        self.period = period
+        self.batch_size = batch_size
+        self.group_timeout = group_timeout
+        self._slots = asyncio.Semaphore(concurrency)
+        self._late = set()  # round ids still running past their timeout
+
+    async def _rotate(self, rnd: dict) -> Optional[dict]:
+        await self._slots.acquire()
+        task = asyncio.ensure_future(advance_round(self.storage, rnd))
+        task.add_done_callback(lambda t: self._finished(t, rnd))
+        # Stop waiting on a slow group but let it finish: cancelling midway
+        # could leave a completed round with no successor. It keeps its slot
+        # until it is done.
+        return await asyncio.wait_for(asyncio.shield(task), self.group_timeout)
+
+    def _finished(self, task: asyncio.Future, rnd: dict):
+        self._slots.release()
+        if task.cancelled() or rnd["_id"] not in self._late:
+            return
+        self._late.discard(rnd["_id"])
+        error = task.exception()
+        print(f"[scheduler] late group {rnd['group_id']} {'failed: ' + repr(error) if error else 'advanced'}")
+
+    async def run_batch(self, number: int, rounds: List[dict]) -> BatchReport:
+        """Advance one batch of due rounds; failures are collected, never raised"""
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self._rotate(r) for r in rounds), return_exceptions=True)
+
+        advanced = skipped = 0
+        failures = []
+        for rnd, result in zip(rounds, results):
+            if isinstance(result, asyncio.TimeoutError):
+                self._late.add(rnd["_id"])
+                failures.append((rnd["group_id"], f"timed out after {self.group_timeout}s, still running"))
+            elif isinstance(result, Exception):
+                failures.append((rnd["group_id"], repr(result)))
+            elif result is None:
+                skipped += 1
+            else:
+                advanced += 1
+        return BatchReport(number, len(rounds), advanced, skipped, failures, time.perf_counter() - start)
+
+    async def run_once(self, now: Optional[datetime] = None) -> List[BatchReport]:
+        """One pass over every round that is due now"""
+        started = datetime.utcnow()
+        # Rounds opened by this pass are never due in it, whatever the period
+        cutoff = min((now or started) - self.period, started)
+        reports = []
+        after = None
+        while True:
+            batch = [r async for r in self.storage.rounds.scan_due(cutoff, after, self.batch_size)]
+            if not batch:
+                return reports
+            # Resume after this batch, so failed rounds are not retried until the next pass
+            after = (batch[-1]["created_at"], batch[-1]["_id"])
+            report = await self.run_batch(len(reports) + 1, batch)
+            reports.append(report)
+            _log(report)
+
+    async def run_forever(self, interval: float = SCHEDULER_INTERVAL_SECONDS):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[scheduler] Rotation pass failed: {e}")
+            await asyncio.sleep(interval)
+
+
+def _log(report: BatchReport):
+    print(
+        f"[scheduler] batch {report.batch}: {report.advanced}/{report.groups} advanced, "
+        f"{report.skipped} skipped, {len(report.failures)} failed in {report.seconds:.2f}s"
+    )
+    for group_id, error in report.failures:
+        print(f"[scheduler]   group {group_id}: {error}")
+
+
+async def _run_cli(args):
+    from storage.factory import open_storage_from_env
+
+    storage = open_storage_from_env()
+    scheduler = Scheduler(
+        storage,
+        period=timedelta(days=args.days),
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        group_timeout=args.group_timeout,
+    )
+    try:
+        if args.once:
+            reports = await scheduler.run_once()
+            failed = sum(len(r.failures) for r in reports)
+            print(f"Advanced {sum(r.advanced for r in reports)} round(s), {failed} failure(s)")
+            if failed:
+                sys.exit(1)
+        else:
+            await scheduler.run_forever(args.interval)
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Advance rounds that are due for rotation")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    parser.add_argument("--days", type=float, default=ROUND_ROTATION_DAYS, help="round length")
+    parser.add_argument("--interval", type=float, default=SCHEDULER_INTERVAL_SECONDS, help="seconds between passes")
+    parser.add_argument("--concurrency", type=int, default=SCHEDULER_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=SCHEDULER_BATCH_SIZE)
+    parser.add_argument("--group-timeout", type=float, default=SCHEDULER_GROUP_TIMEOUT_SECONDS)
+    asyncio.run(_run_cli(parser.parse_args()))
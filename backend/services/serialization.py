@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import json
+import os
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple, Type, TypeVar, Union
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+# Opt-in: routes skip building/validating pydantic models for documents read
+# from our own collections and encode them straight to JSON. The response body
+# is byte-for-byte what the response_model path would produce.
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "false").lower() == "true"
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def _bson_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """Encode JSON, handling ObjectId and datetime values from BSON documents"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_bson_default)
+    return json.dumps(content, default=_bson_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson when it is installed"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def _shape(model: Type[BaseModel]) -> Tuple[Tuple[str, object], ...]:
+    # (output key, default) per field, in declaration order
+    return tuple(
+        (field.alias or name, None if field.is_required() else field.get_default(call_default_factory=True))
+        for name, field in model.model_fields.items()
+    )
+
+
+def trusted_dump(model: Type[BaseModel], doc: dict) -> dict:
+    """Project a stored document onto a model's fields without validating it"""
+    return {key: doc.get(key, default) for key, default in _shape(model)}
+
+
+def trusted(model: Type[M], doc: dict) -> M:
+    """Build a model from a stored document without validating it"""
+    return model.model_construct(**doc)
+
+
+def model_response(model: Type[M], doc: dict, headers: Optional[dict] = None) -> Union[M, FastJSONResponse]:
+    """Respond with one stored document, through the fast path when it is enabled"""
+    if FAST_SERIALIZATION:
+        return FastJSONResponse(trusted_dump(model, doc), headers=headers)
+    return model(**doc)
+
+
+def models_response(
+    model: Type[M], docs: Iterable[dict], headers: Optional[dict] = None
+) -> Union[List[M], FastJSONResponse]:
+    """Respond with a list of stored documents, through the fast path when it is enabled"""
+    if FAST_SERIALIZATION:
+        return FastJSONResponse([trusted_dump(model, d) for d in docs], headers=headers)
+    return [model(**d) for d in docs]
+
+
+def prebuilt_response(items: List[M], headers: Optional[dict] = None) -> Union[List[M], FastJSONResponse]:
+    """Respond with models that were already built (e.g. cached), skipping response_model re-validation"""
+    if FAST_SERIALIZATION:
+        return FastJSONResponse([m.model_dump(by_alias=True) for m in items], headers=headers)
+    return items
+
+
+def dump_line(model: Type[BaseModel], doc: dict) -> bytes:
+    """One NDJSON line for a stored document"""
+    if FAST_SERIALIZATION:
+        return dumps(trusted_dump(model, doc)) + b"\n"
+    return model(**doc).model_dump_json(by_alias=True).encode() + b"\n"
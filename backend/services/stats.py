@@ -0,0 +1,86 @@
+"""Per-group and global round statistics, read from rollup documents.
+
+Each group has a rollup of summed counters, and one more rollup sums every
+group. Opening a round and completing a deed `$inc` them in the same request,
+so reading stats is a single point read however much history a group has.
+
+Rebuild every rollup from the rounds and deeds, e.g. after a bug or to
+backfill existing data, from backend/ (run it while the app is quiet, since
+increments landing mid-rebuild can be lost):
+    python -m services.stats --rebuild
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from services.counters import is_round_complete
+from storage.base import Storage
+
+COUNTERS = (
+    "rounds_started",
+    "rounds_completed",
+    "rounds_fully_completed",
+    "deeds_assigned",
+    "deeds_completed",
+    "deed_seconds",
+    "round_seconds",
+)
+
+
+async def record_round_opened(storage: Storage, group_id: str, deeds_assigned: int, rounds_completed: int = 0):
+    await storage.stats.record(group_id, {
+        "rounds_started": 1,
+        "rounds_completed": rounds_completed,
+        "deeds_assigned": deeds_assigned,
+    })
+
+
+async def record_deed_completed(storage: Storage, counters: dict, completed_at: datetime):
+    """Count a first completion, given the counters `record_completion` handed back"""
+    elapsed = (completed_at - counters["created_at"]).total_seconds()
+    increments = {"deeds_completed": 1, "deed_seconds": elapsed}
+    if is_round_complete(counters):
+        # This was the round's last deed, so it finished `elapsed` after it opened
+        increments.update(rounds_fully_completed=1, round_seconds=elapsed)
+    await storage.stats.record(counters["group_id"], increments)
+
+
+def _ratio(part: float, whole: float) -> Optional[float]:
+    return round(part / whole, 4) if whole else None
+
+
+def summarize(rollup: Optional[dict], group_id: Optional[str] = None) -> dict:
+    """The stats payload for a rollup; a missing rollup means nothing happened yet"""
+    totals = {field: (rollup or {}).get(field, 0) for field in COUNTERS}
+    return {
+        "group_id": group_id,
+        **{field: int(totals[field]) for field in COUNTERS if not field.endswith("_seconds")},
+        "deed_completion_rate": _ratio(totals["deeds_completed"], totals["deeds_assigned"]),
+        "round_completion_rate": _ratio(totals["rounds_fully_completed"], totals["rounds_started"]),
+        "avg_deed_seconds": _ratio(totals["deed_seconds"], totals["deeds_completed"]),
+        "avg_round_seconds": _ratio(totals["round_seconds"], totals["rounds_fully_completed"]),
+    }
+
+
+async def _run_cli():
+    from storage.factory import open_storage_from_env
+
+    storage = open_storage_from_env()
+    try:
+        groups = await storage.stats.rebuild()
+        print(f"Rebuilt stats rollups for {groups} group(s)")
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild stats rollups from rounds and deeds")
+    parser.add_argument("--rebuild", action="store_true", required=True, help="recompute every rollup")
+    parser.parse_args()
+    asyncio.run(_run_cli())
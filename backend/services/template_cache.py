@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import asyncio
+import os
+import random
+import time
+from typing import List, Optional, Tuple
+
+from models import DeedTemplate
+from services.invalidation import TEMPLATES, invalidator
+from services.serialization import trusted
+from storage.base import Storage
+
+# How long a loaded pool is trusted before re-reading it; a backstop in case an
+# invalidation from another worker is lost
+TEMPLATE_CACHE_TTL_SECONDS = float(os.getenv("TEMPLATE_CACHE_TTL_SECONDS", "60"))
+
+
+class TemplateCache:
+    """Process-level cache of the deed template pool.
+
+    Every write to `deed_templates`, by this worker or another, reaches
+    `invalidate()` through the cache invalidator, which bumps `version` and
+    drops the loaded pool.
+    """
+
+    def __init__(self, ttl_seconds: float = TEMPLATE_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._templates: Optional[Tuple[DeedTemplate, ...]] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._templates is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    def invalidate(self):
+        """Drop the cached pool; the next read reloads it"""
+        self.version += 1
+        self._templates = None
+
+    async def get(self, storage: Storage) -> Tuple[DeedTemplate, ...]:
+        """Get every template, reading the collection only on a miss"""
+        if self._is_fresh():
+            return self._templates
+
+        async with self._lock:
+            # Another request may have reloaded while we waited
+            if self._is_fresh():
+                return self._templates
+
+            version = self.version
+            templates = tuple(trusted(DeedTemplate, t) for t in await storage.templates.list())
+
+            # Only publish if nothing invalidated the pool mid-load
+            if version == self.version:
+                self._templates = templates
+                self._loaded_at = time.monotonic()
+            return templates
+
+    async def descriptions(self, storage: Storage) -> List[str]:
+        """Get the description of every template"""
+        return [t.description for t in await self.get(storage)]
+
+    async def random(self, storage: Storage) -> Optional[DeedTemplate]:
+        """Pick a random template, or None if the pool is empty"""
+        templates = await self.get(storage)
+        return random.choice(templates) if templates else None
+
+
+template_cache = TemplateCache()
+invalidator.subscribe(TEMPLATES, lambda _: template_cache.invalidate())
@@ -0,0 +1,51 @@
+import math
+import os
+import random
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+# A group's "heat" for a template is how much it has been dealt lately: each
+# round adds 1 per pass through the pool it was dealt in, and every round
+# multiplies the old heat by TEMPLATE_HEAT_DECAY
+TEMPLATE_HEAT_DECAY = float(os.getenv("TEMPLATE_HEAT_DECAY", "0.5"))
+# How strongly heat lowers a template's weight: weight = 1 / (1 + penalty * heat)
+TEMPLATE_HEAT_PENALTY = 4.0
+# Heat below this is forgotten, which keeps the stored state small
+MIN_HEAT = 0.01
+
+
+class TemplateSampler:
+    """Deals a round's deed templates for one group.
+
+    Templates are drawn without replacement, weighted against the group's
+    recent use, so a round repeats a template only once every template has
+    been dealt. Built from the pool and the group's stored heat, so drawing
+    costs no queries.
+    """
+
+    def __init__(self, templates: Sequence[str], heat: Optional[Dict[str, float]] = None):
+        self.templates = list(dict.fromkeys(templates))
+        self.heat = heat or {}
+        self.weights = [1.0 / (1.0 + TEMPLATE_HEAT_PENALTY * self.heat.get(t, 0.0)) for t in self.templates]
+
+    def _weighted_order(self) -> List[str]:
+        # Efraimidis-Spirakis: sorting by Exp(1)/weight is a weighted draw without replacement
+        keys = [-math.log(1.0 - random.random()) / w for w in self.weights]
+        return [t for _, t in sorted(zip(keys, self.templates))]
+
+    def draw(self, count: int) -> List[str]:
+        """One template per member, as evenly spread over the pool as the round allows"""
+        if not self.templates:
+            raise ValueError("Cannot draw from an empty template pool")
+        drawn: List[str] = []
+        while len(drawn) < count:
+            drawn.extend(self._weighted_order()[:count - len(drawn)])
+        return drawn
+
+    def heat_after(self, drawn: List[str]) -> Dict[str, float]:
+        """The group's heat once this round's draw is dealt"""
+        heat = {t: h * TEMPLATE_HEAT_DECAY for t, h in self.heat.items()}
+        passes = math.ceil(len(drawn) / len(self.templates)) if self.templates else 1
+        for template, uses in Counter(drawn).items():
+            heat[template] = heat.get(template, 0.0) + uses / passes
+        return {t: round(h, 4) for t, h in heat.items() if h >= MIN_HEAT}
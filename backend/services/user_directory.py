@@ -0,0 +1,127 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from services.invalidation import USERS, invalidator
+from storage.base import Storage
+
+USER_DIRECTORY_SIZE = int(os.getenv("USER_DIRECTORY_SIZE", "10000"))
+# Names looked up and not found are remembered this long (and at most this
+# many), so repeated logins with an unknown name do not each hit the database
+UNKNOWN_NAME_TTL_SECONDS = 30.0
+UNKNOWN_NAME_LIMIT = 1000
+
+
+class UserDirectory:
+    """Process-level LRU cache of user documents, by id and by name.
+
+    Users never change after creation, so entries only leave by eviction or
+    invalidation: `create_user` and the cache invalidator (writes from any
+    worker) clear the unknown-name cache and any stale entry.
+    """
+
+    def __init__(self, size: int = USER_DIRECTORY_SIZE):
+        self.size = size
+        self._by_id: "OrderedDict[str, dict]" = OrderedDict()
+        self._id_by_name: Dict[str, str] = {}
+        self._unknown_names: "OrderedDict[str, float]" = OrderedDict()  # name -> expiry
+
+    def _put(self, user: dict):
+        self._by_id[user["_id"]] = user
+        self._by_id.move_to_end(user["_id"])
+        self._id_by_name[user["name"]] = user["_id"]
+        while len(self._by_id) > self.size:
+            _, evicted = self._by_id.popitem(last=False)
+            self._id_by_name.pop(evicted["name"], None)
+
+    def _cached(self, user_id: str) -> Optional[dict]:
+        user = self._by_id.get(user_id)
+        if user is not None:
+            self._by_id.move_to_end(user_id)
+            return dict(user)
+        return None
+
+    def _known_unknown(self, name: str) -> bool:
+        expires = self._unknown_names.get(name)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._unknown_names[name]
+            return False
+        return True
+
+    def _remember_unknown(self, name: str):
+        self._unknown_names[name] = time.monotonic() + UNKNOWN_NAME_TTL_SECONDS
+        self._unknown_names.move_to_end(name)
+        while len(self._unknown_names) > UNKNOWN_NAME_LIMIT:
+            self._unknown_names.popitem(last=False)
+
+    def added(self, user: dict):
+        """Record a user this worker just created"""
+        self._unknown_names.pop(user["name"], None)
+        self._put(dict(user))
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """Forget one user, or everyone; unknown names are always forgotten"""
+        self._unknown_names.clear()
+        if user_id is None:
+            self._by_id.clear()
+            self._id_by_name.clear()
+            return
+        user = self._by_id.pop(user_id, None)
+        if user is not None:
+            self._id_by_name.pop(user["name"], None)
+
+    async def get(self, storage: Storage, user_id: str) -> Optional[dict]:
+        user = self._cached(user_id)
+        if user is None:
+            user = await storage.users.get(user_id)
+            if user is not None:
+                self._put(dict(user))
+        return user
+
+    async def get_by_name(self, storage: Storage, name: str) -> Optional[dict]:
+        user_id = self._id_by_name.get(name)
+        if user_id is not None:
+            return self._cached(user_id)
+        if self._known_unknown(name):
+            return None
+
+        user = await storage.users.get_by_name(name)
+        if user is None:
+            self._remember_unknown(name)
+        else:
+            self._put(dict(user))
+        return user
+
+    async def get_many(self, storage: Storage, user_ids: List[str]) -> List[dict]:
+        """Users for the given ids in the same order, skipping unknown ids; all misses share one query"""
+        found = {}
+        missing = []
+        for user_id in user_ids:
+            user = self._cached(user_id)
+            if user is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = user
+
+        if missing:
+            for user in await storage.users.get_many(missing):
+                self._put(dict(user))
+                found[user["_id"]] = user
+        return [found[uid] for uid in user_ids if uid in found]
+
+    async def named(self, storage: Storage, rows: List[dict]) -> List[dict]:
+        """Fill in `name` on rows keyed by user `_id`, dropping rows whose user no longer exists"""
+        users = {u["_id"]: u for u in await self.get_many(storage, [r["_id"] for r in rows])}
+        return [{**row, "name": users[row["_id"]]["name"]} for row in rows if row["_id"] in users]
+
+
+user_directory = UserDirectory()
+invalidator.subscribe(USERS, user_directory.invalidate)
@@ -0,0 +1,175 @@
+"""Bulk import of users and group memberships.
+
+Each row names a user and, optionally, a group for them to join: CSV with a
+`name` column and an optional `group_id` column, or NDJSON objects with the
+same keys. Someone joining several groups appears on several rows, and
+names that already exist just gain the memberships.
+
+Rows are validated and written IMPORT_BATCH_SIZE at a time, and only the
+current batch is held in memory, however large the file. Each batch costs
+one concurrent lookup of its names and groups, one unordered insert of the
+new names, and one unordered upsert of the memberships. The unique name index
+settles races with concurrent signups. Invalid rows, and rows naming an
+unknown group, are reported with their line numbers and skipped.
+
+Import a file from backend/:
+    python -m services.user_import people.csv
+    python -m services.user_import people.ndjson
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+from typing import AsyncIterator, Callable, Optional, Tuple
+
+from bson import ObjectId
+from pydantic import ValidationError
+
+from models import UserImportRow
+from services.bulk import IMPORT_BATCH_SIZE, MAX_REPORTED_ERRORS, Row, batched, csv_rows, ndjson_rows
+from services.invalidation import USERS, invalidator
+from storage.base import Storage
+
+FILE_CHUNK_BYTES = 64 * 1024
+
+
+def _entry(row: Row) -> Tuple[Optional[UserImportRow], Optional[str]]:
+    if row.error:
+        return None, row.error
+    if not isinstance(row.value, dict):
+        return None, "Row must be an object with a name"
+    try:
+        entry = UserImportRow.model_validate(row.value)
+    except ValidationError as e:
+        error = e.errors()[0]
+        return None, f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+    if not entry.name.strip():
+        return None, "Name must not be blank"
+    if entry.group_id is not None and not ObjectId.is_valid(entry.group_id):
+        return None, f"Invalid group_id {entry.group_id!r}"
+    return entry, None
+
+
+def _reject(report: dict, line: int, error: str):
+    report["invalid"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"line": line, "error": error})
+
+
+async def _import_batch(storage: Storage, batch: list, report: dict):
+    entries = []
+    for row in batch:
+        entry, error = _entry(row)
+        if error:
+            _reject(report, row.line, error)
+        else:
+            entries.append((row.line, entry))
+    report["rows"] += len(batch)
+    if not entries:
+        return
+
+    names = list(dict.fromkeys(e.name for _, e in entries))
+    existing, groups = await asyncio.gather(
+        storage.users.get_many_by_name(names),
+        storage.groups.get_many([e.group_id for _, e in entries if e.group_id]),
+    )
+    known_groups = {g["_id"] for g in groups}
+    # A row naming an unknown group creates nobody
+    for line, e in entries:
+        if e.group_id is not None and e.group_id not in known_groups:
+            _reject(report, line, f"Group {e.group_id} not found")
+    entries = [(line, e) for line, e in entries if e.group_id is None or e.group_id in known_groups]
+    users = {u["name"]: u["_id"] for u in existing}
+    names = list(dict.fromkeys(e.name for _, e in entries))
+    new_names = [n for n in names if n not in users]
+    created = await storage.users.create_many(new_names)
+    users.update((u["name"], u["_id"]) for u in created)
+    if len(created) < len(new_names):
+        # Lost races with concurrent signups: those names exist now
+        lost = [n for n in new_names if n not in users]
+        users.update((u["name"], u["_id"]) for u in await storage.users.get_many_by_name(lost))
+    report["users_created"] += len(created)
+    report["users_existing"] += len(names) - len(created)
+
+    memberships = list(dict.fromkeys((e.group_id, users[e.name]) for _, e in entries if e.group_id))
+    added = await storage.members.add_many(memberships)
+    report["memberships_added"] += added
+    report["memberships_existing"] += len(memberships) - added
+    if added:
+        # Every live round's status lists the group's current members
+        await asyncio.gather(*(storage.rounds.touch_group(g) for g in dict.fromkeys(g for g, _ in memberships)))
+    if created:
+        await invalidator.wrote_many(USERS, [u["_id"] for u in created])
+
+
+async def import_users(
+    storage: Storage,
+    rows: AsyncIterator[Row],
+    batch_size: int = IMPORT_BATCH_SIZE,
+    on_batch: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """Import user and membership rows a batch at a time; returns the counts and the first per-row errors"""
+    report = {
+        "rows": 0,
+        "users_created": 0,
+        "users_existing": 0,
+        "memberships_added": 0,
+        "memberships_existing": 0,
+        "invalid": 0,
+        "errors": [],
+        "batches": 0,
+    }
+    async for batch in batched(rows, batch_size):
+        await _import_batch(storage, batch, report)
+        report["batches"] += 1
+        if on_batch:
+            on_batch(report)
+    return report
+
+
+def log_progress(report: dict):
+    print(
+        f"[import] batch {report['batches']}, {report['rows']} row(s): {report['users_created']} user(s) created, "
+        f"{report['memberships_added']} membership(s) added, {report['invalid']} invalid"
+    )
+
+
+async def _file_chunks(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(FILE_CHUNK_BYTES):
+            yield chunk
+
+
+async def _run_cli(args):
+    from storage.factory import open_storage_from_env
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    rows = (csv_rows if fmt == "csv" else ndjson_rows)(_file_chunks(args.path))
+    storage = open_storage_from_env()
+    try:
+        report = await import_users(storage, rows, args.batch_size, log_progress)
+    finally:
+        await storage.close()
+
+    for error in report["errors"]:
+        print(f"line {error['line']}: {error['error']}")
+    if report["invalid"] > len(report["errors"]):
+        print(f"... and {report['invalid'] - len(report['errors'])} more invalid row(s)")
+    print(
+        f"Imported {report['rows']} row(s): {report['users_created']} user(s) created, "
+        f"{report['users_existing']} already existed; {report['memberships_added']} membership(s) added, "
+        f"{report['memberships_existing']} already existed; {report['invalid']} invalid"
+    )
+    if report["invalid"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import users and group memberships from CSV or NDJSON")
+    parser.add_argument("path", help="file of rows with a name and an optional group_id")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="default: csv for .csv files, else ndjson")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    asyncio.run(_run_cli(parser.parse_args()))
@@ -0,0 +1 @@
+# Empty file - just makes storage a package
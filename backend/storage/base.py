@@ -0,0 +1,267 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+# Repositories take and return plain dicts shaped like the API models, with
+# every id (including `_id`) as a hex string.
+#
+# `scan*` methods are async generators for keyset pagination: they yield
+# documents in a stable order, starting strictly after the given cursor, and
+# never materialize more than the current batch.
+
+
+class UserRepository(ABC):
+    @abstractmethod
+    def scan(self, after: Optional[str] = None, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        """Users in `_id` order"""
+
+    @abstractmethod
+    async def create(self, name: str) -> Optional[dict]:
+        """Insert a user and return it; None if the name is already taken"""
+
+    @abstractmethod
+    async def get(self, user_id: str) -> Optional[dict]:
+        """User by id"""
+
+    @abstractmethod
+    async def get_by_name(self, name: str) -> Optional[dict]:
+        """User by unique name"""
+
+    @abstractmethod
+    async def get_many(self, user_ids: List[str]) -> List[dict]:
+        """Users with any of the given ids, in no particular order; unknown ids are skipped"""
+
+    @abstractmethod
+    async def create_many(self, names: List[str]) -> List[dict]:
+        """Insert a user for every name not already taken, in one unordered write; returns the users inserted"""
+
+    @abstractmethod
+    async def get_many_by_name(self, names: List[str]) -> List[dict]:
+        """Users with any of the given names, in no particular order; unknown names are skipped"""
+
+
+class GroupRepository(ABC):
+    @abstractmethod
+    def scan(self, after: Optional[str] = None, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        """Groups in `_id` order"""
+
+    @abstractmethod
+    async def create(self, name: str) -> dict:
+        """Insert a group and return it"""
+
+    @abstractmethod
+    async def get(self, group_id: str) -> Optional[dict]:
+        """Group by id"""
+
+    @abstractmethod
+    async def get_many(self, group_ids: List[str]) -> List[dict]:
+        """Groups with any of the given ids, in no particular order; unknown ids are skipped"""
+
+    @abstractmethod
+    async def set_exclusions(self, group_id: str, pairs: List[Tuple[str, str]]) -> bool:
+        """Replace the pairs of members who never draw each other; False if the group does not exist"""
+
+    @abstractmethod
+    async def set_template_heat(self, group_id: str, heat: Dict[str, float]):
+        """Store the group's template sampler state, as `template_heat` [description, heat] pairs"""
+
+
+class MemberRepository(ABC):
+    @abstractmethod
+    async def add(self, group_id: str, user_id: str):
+        """Add a user to a group; joining twice is a no-op"""
+
+    @abstractmethod
+    async def add_many(self, memberships: List[Tuple[str, str]]) -> int:
+        """Add (group_id, user_id) memberships in one unordered write; returns how many were new"""
+
+    @abstractmethod
+    async def list_user_ids(self, group_id: str) -> List[str]:
+        """Ids of every member of a group, in joining order"""
+
+    @abstractmethod
+    async def list_groups(self, user_id: str) -> List[dict]:
+        """Group documents of every group a user belongs to"""
+
+
+class RoundRepository(ABC):
+    @abstractmethod
+    async def get(self, round_id: str) -> Optional[dict]:
+        """Round by id"""
+
+    @abstractmethod
+    async def get_active(self, group_id: str) -> Optional[dict]:
+        """The group's active round, if any"""
+
+    @abstractmethod
+    async def get_version(self, round_id: str) -> Optional[int]:
+        """The round's `version`, or None if it does not exist"""
+
+    @abstractmethod
+    async def touch_group(self, group_id: str):
+        """Bump the version of every live round of the group, e.g. after its membership changed"""
+
+    @abstractmethod
+    def scan_for_group(
+        self, group_id: str, after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        """Rounds of a group, newest first, after a `(created_at, _id)` cursor"""
+
+    @abstractmethod
+    async def create(self, doc: dict) -> Optional[dict]:
+        """Insert a round and return it with its id; a preset `_id` is kept, None if it is already taken"""
+
+    @abstractmethod
+    async def claim_advance(self, round_id: str, from_status: str, next_round_id: str) -> bool:
+        """Complete a round still in `from_status` and record its successor; False if another advancer won"""
+
+    @abstractmethod
+    def scan_due(
+        self, cutoff: datetime, after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        """Active rounds created before `cutoff`, oldest first, after a `(created_at, _id)` cursor"""
+
+    @abstractmethod
+    async def complete_active(self, group_id: str) -> List[str]:
+        """Mark the group's active rounds completed; returns their ids"""
+
+    @abstractmethod
+    def scan_archivable(self, cutoff: datetime, limit: int) -> AsyncIterator[dict]:
+        """Completed rounds created and completed before `cutoff`, oldest first.
+
+        Rounds completed before `completed_at` was recorded qualify on `created_at` alone.
+        """
+
+    @abstractmethod
+    async def init_counters(self, round_id: str, total_members: int):
+        """Set the completion counters once deeds have been assigned"""
+
+    @abstractmethod
+    async def record_completion(self, round_id: str) -> Optional[dict]:
+        """Increment `completed_count` and return the round's counters, `group_id` and `created_at`"""
+
+    @abstractmethod
+    async def reconcile_counters(self, only_active: bool = True, batch_size: int = 500) -> int:
+        """Recount deeds and repair drifted counters; returns rounds repaired"""
+
+    @abstractmethod
+    async def member_statuses(self, round_id: str) -> Optional[List[dict]]:
+        """`MemberStatus` rows for every group member, without `name`, or None if the round does not exist"""
+
+
+class DeedRepository(ABC):
+    @abstractmethod
+    async def insert_many(self, docs: List[dict]):
+        """Insert deed assignments in one write"""
+
+    @abstractmethod
+    async def get_for_user(self, round_id: str, user_id: str) -> Optional[dict]:
+        """A user's deed in a round"""
+
+    @abstractmethod
+    async def complete(self, round_id: str, user_id: str, completed_at: datetime) -> Optional[dict]:
+        """Atomically mark an open deed completed and return its state from before; a completed one is left as is"""
+
+    @abstractmethod
+    def scan_for_round(self, round_id: str, after: Optional[str] = None, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        """Deeds in a round in `_id` order"""
+
+
+class TemplateRepository(ABC):
+    @abstractmethod
+    async def list(self) -> List[dict]:
+        """All deed templates in `_id` order"""
+
+    @abstractmethod
+    async def create(self, description: str) -> Optional[dict]:
+        """Insert a template and return it; None if the description already exists"""
+
+    @abstractmethod
+    async def delete(self, template_id: str) -> bool:
+        """Delete a template; False if it did not exist"""
+
+    @abstractmethod
+    async def seed(self, descriptions: List[str]) -> int:
+        """Upsert descriptions in one bulk write; returns how many were new"""
+
+
+class CelebrationRepository(ABC):
+    @abstractmethod
+    async def has_seen(self, round_id: str, user_id: str) -> bool:
+        """Whether the user has seen the round's celebration"""
+
+    @abstractmethod
+    async def mark_seen(self, round_id: str, user_id: str) -> bool:
+        """Record the celebration as seen; False if it already was"""
+
+
+class PairHistoryRepository(ABC):
+    # One document per (group, giver) holding the giver's most recent targets
+
+    @abstractmethod
+    async def recent_targets(self, group_id: str) -> Dict[str, List[str]]:
+        """giver id -> their recent target ids in the group, newest first"""
+
+    @abstractmethod
+    async def record(self, group_id: str, pairs: List[Tuple[str, str]], keep: int):
+        """Prepend each (giver, target) to the giver's history, keeping the newest `keep`"""
+
+
+class ArchiveRepository(ABC):
+    # One document per archived round: the round's own fields, with its deeds
+    # and celebration marks embedded as `deeds` and `celebrations`
+
+    @abstractmethod
+    async def get(self, round_id: str) -> Optional[dict]:
+        """An archived round's own fields, without what is embedded"""
+
+    @abstractmethod
+    def scan_for_group(
+        self, group_id: str, after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        """Archived rounds of a group, newest first, after a `(created_at, _id)` cursor, without what is embedded"""
+
+    @abstractmethod
+    async def archive(self, rounds: List[dict]) -> int:
+        """Move completed rounds, their deeds and celebration marks into the archive; returns rounds moved.
+
+        Safe to repeat after a failure part way: the archive document is
+        written first and never overwritten, and the live documents are
+        deleted after it.
+        """
+
+
+class StatsRepository(ABC):
+    # Rollup documents of summed counters: one per group plus one for everything
+
+    @abstractmethod
+    async def record(self, group_id: str, increments: Dict[str, float]):
+        """Add the increments to the group's rollup and to the global one"""
+
+    @abstractmethod
+    async def get(self, group_id: Optional[str] = None) -> Optional[dict]:
+        """A group's rollup, or the global one when no group is given"""
+
+    @abstractmethod
+    async def rebuild(self) -> int:
+        """Recompute every rollup from live and archived rounds; returns how many groups have one"""
+
+
+class Storage:
+    """Bundle of repositories for one backend"""
+
+    kind: str
+
+    users: UserRepository
+    groups: GroupRepository
+    members: MemberRepository
+    rounds: RoundRepository
+    deeds: DeedRepository
+    templates: TemplateRepository
+    celebrations: CelebrationRepository
+    pair_history: PairHistoryRepository
+    archive: ArchiveRepository
+    stats: StatsRepository
+
+    async def close(self):
+        pass
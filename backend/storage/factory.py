@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from storage.base import Storage
+from storage.memory import MemoryStorage
+from storage.mongo import MongoStorage
+
+STORAGE_BACKENDS = ("mongo", "memory")
+
+
+def create_storage(
+    backend: str, mongo_uri: str = None, mongo_db_name: str = "secret_santa", **client_options
+) -> Storage:
+    """Build the storage backend selected by config; `client_options` go to the Mongo client"""
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "mongo":
+        if not mongo_uri:
+            raise ValueError("MONGO_URI is required for the mongo storage backend")
+        client = AsyncIOMotorClient(mongo_uri, **client_options)
+        return MongoStorage(client, client[mongo_db_name])
+    raise ValueError(f"Unknown storage backend '{backend}', expected one of {STORAGE_BACKENDS}")
+
+
+def open_storage_from_env() -> Storage:
+    """Storage for command line tools, configured from backend/.env like the app"""
+    load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env", override=False)
+    try:
+        return create_storage(
+            os.getenv("STORAGE_BACKEND", "mongo"),
+            os.getenv("MONGO_URI"),
+            os.getenv("MONGO_DB_NAME", "secret_santa"),
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
@@ -0,0 +1,518 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import bisect
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from storage.base import (
+    ArchiveRepository,
+    CelebrationRepository,
+    DeedRepository,
+    GroupRepository,
+    MemberRepository,
+    PairHistoryRepository,
+    RoundRepository,
+    StatsRepository,
+    Storage,
+    TemplateRepository,
+    UserRepository,
+)
+from storage.pipelines import GLOBAL_STATS_ID
+
+# Everything lives in dicts keyed by id, plus secondary dict indexes for each
+# access path the Mongo indexes cover. Operations never await mid-update, so
+# each one is atomic on the event loop just like a single Mongo command.
+
+
+def _new_id() -> str:
+    return str(ObjectId())
+
+
+def _copy(doc: Optional[dict]) -> Optional[dict]:
+    return dict(doc) if doc is not None else None
+
+
+def _bump(rnd: dict):
+    rnd["version"] = rnd.get("version", 0) + 1
+
+
+class IdIndex:
+    """A table's ids in sorted order, so a keyset page is a bisect and a slice like an index scan"""
+
+    def __init__(self):
+        self.ids: List[str] = []
+
+    def add(self, doc_id: str):
+        # Fresh ObjectIds from this process only grow, so this is nearly always an append
+        if not self.ids or doc_id > self.ids[-1]:
+            self.ids.append(doc_id)
+        else:
+            bisect.insort(self.ids, doc_id)
+
+    def page(self, after: Optional[str], limit: Optional[int]) -> List[str]:
+        start = bisect.bisect_right(self.ids, after) if after is not None else 0
+        return self.ids[start:start + limit] if limit else self.ids[start:]
+
+
+async def _scan_by_id(
+    table: Dict[str, dict], index: IdIndex, after: Optional[str], limit: Optional[int]
+) -> AsyncIterator[dict]:
+    for doc_id in index.page(after, limit):
+        # Skip anything removed since the page was sliced
+        doc = table.get(doc_id)
+        if doc is not None:
+            yield _copy(doc)
+
+
+class MemoryTables:
+    def __init__(self):
+        self.users: Dict[str, dict] = {}
+        self.user_ids = IdIndex()
+        self.users_by_name: Dict[str, str] = {}
+        self.groups: Dict[str, dict] = {}
+        self.group_ids = IdIndex()
+        # group_id -> user_id -> membership, and user_id -> ordered set of group_ids
+        self.members_by_group: Dict[str, Dict[str, dict]] = defaultdict(dict)
+        self.groups_by_user: Dict[str, Dict[str, None]] = defaultdict(dict)
+        self.rounds: Dict[str, dict] = {}
+        self.rounds_by_group: Dict[str, List[str]] = defaultdict(list)
+        self.deeds: Dict[str, dict] = {}
+        # round_id -> user_id -> deed id, and round_id -> deed ids in order
+        self.deeds_by_round: Dict[str, Dict[str, str]] = defaultdict(dict)
+        self.deed_ids_by_round: Dict[str, IdIndex] = defaultdict(IdIndex)
+        self.templates: Dict[str, dict] = {}
+        self.templates_by_description: Dict[str, str] = {}
+        self.celebrations: Dict[Tuple[str, str], dict] = {}
+        # group_id -> giver id -> recent target ids, newest first
+        self.pair_history: Dict[str, Dict[str, List[str]]] = defaultdict(dict)
+        # round_id -> archive document, and group_id -> archived round ids
+        self.archive: Dict[str, dict] = {}
+        self.archive_by_group: Dict[str, List[str]] = defaultdict(list)
+        # group_id (or GLOBAL_STATS_ID) -> stats rollup
+        self.stats: Dict[str, dict] = {}
+
+
+class MemoryUserRepository(UserRepository):
+    def __init__(self, tables: MemoryTables):
+        self.t = tables
+
+    def scan(self, after: Optional[str] = None, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        return _scan_by_id(self.t.users, self.t.user_ids, after, limit)
+
+    async def create(self, name: str) -> Optional[dict]:
+        if name in self.t.users_by_name:
+            return None
+        doc = {"_id": _new_id(), "name": name, "created_at": datetime.utcnow()}
+        self.t.users[doc["_id"]] = doc
+        self.t.user_ids.add(doc["_id"])
+        self.t.users_by_name[name] = doc["_id"]
+        return _copy(doc)
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        return _copy(self.t.users.get(user_id))
+
+    async def get_by_name(self, name: str) -> Optional[dict]:
+        user_id = self.t.users_by_name.get(name)
+        return _copy(self.t.users.get(user_id)) if user_id else None
+
+    async def get_many(self, user_ids: List[str]) -> List[dict]:
+        users = (self.t.users.get(uid) for uid in dict.fromkeys(user_ids))
+        return [_copy(u) for u in users if u is not None]
+
+    async def create_many(self, names: List[str]) -> List[dict]:
+        return [await self.create(name) for name in dict.fromkeys(names) if name not in self.t.users_by_name]
+
+    async def get_many_by_name(self, names: List[str]) -> List[dict]:
+        return await self.get_many([self.t.users_by_name[n] for n in names if n in self.t.users_by_name])
+
+
+class MemoryGroupRepository(GroupRepository):
+    def __init__(self, tables: MemoryTables):
+        self.t = tables
+
+    def scan(self, after: Optional[str] = None, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        return _scan_by_id(self.t.groups, self.t.group_ids, after, limit)
+
+    async def create(self, name: str) -> dict:
+        doc = {"_id": _new_id(), "name": name, "created_at": datetime.utcnow()}
+        self.t.groups[doc["_id"]] = doc
+        self.t.group_ids.add(doc["_id"])
+        return _copy(doc)
+
+    async def get(self, group_id: str) -> Optional[dict]:
+        return _copy(self.t.groups.get(group_id))
+
+    async def get_many(self, group_ids: List[str]) -> List[dict]:
+        groups = (self.t.groups.get(gid) for gid in dict.fromkeys(group_ids))
+        return [_copy(g) for g in groups if g is not None]
+
+    async def set_exclusions(self, group_id: str, pairs: List[Tuple[str, str]]) -> bool:
+        group = self.t.groups.get(group_id)
+        if group is None:
+            return False
+        group["exclusions"] = [list(p) for p in pairs]
+        return True
+
+    async def set_template_heat(self, group_id: str, heat: Dict[str, float]):
+        group = self.t.groups.get(group_id)
+        if group is not None:
+            group["template_heat"] = [[t, h] for t, h in heat.items()]
+
+
+class MemoryMemberRepository(MemberRepository):
+    def __init__(self, tables: MemoryTables):
+        self.t = tables
+
+    async def add(self, group_id: str, user_id: str):
+        members = self.t.members_by_group[group_id]
+        if user_id not in members:
+            members[user_id] = {
+                "_id": _new_id(),
+                "group_id": group_id,
+                "user_id": user_id,
+                "joined_at": datetime.utcnow(),
+            }
+            self.t.groups_by_user[user_id][group_id] = None
+
+    async def add_many(self, memberships: List[Tuple[str, str]]) -> int:
+        added = 0
+        for group_id, user_id in memberships:
+            if user_id not in self.t.members_by_group.get(group_id, {}):
+                await self.add(group_id, user_id)
+                added += 1
+        return added
+
+    async def list_user_ids(self, group_id: str) -> List[str]:
+        return list(self.t.members_by_group.get(group_id, {}))
+
+    async def list_groups(self, user_id: str) -> List[dict]:
+        groups = (self.t.groups.get(gid) for gid in self.t.groups_by_user.get(user_id, {}))
+        return [_copy(g) for g in groups if g is not None]
+
+
+class MemoryRoundRepository(RoundRepository):
+    def __init__(self, tables: MemoryTables):
+        self.t = tables
+
+    async def get(self, round_id: str) -> Optional[dict]:
+        return _copy(self.t.rounds.get(round_id))
+
+    async def get_active(self, group_id: str) -> Optional[dict]:
+        for round_id in self.t.rounds_by_group.get(group_id, ()):
+            if self.t.rounds[round_id]["status"] == "active":
+                return _copy(self.t.rounds[round_id])
+        return None
+
+    async def scan_for_group(
+        self, group_id: str, after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        rounds = [self.t.rounds[rid] for rid in self.t.rounds_by_group.get(group_id, ())]
+        rounds.sort(key=lambda r: (r["created_at"], r["_id"]), reverse=True)
+        if after:
+            rounds = [r for r in rounds if (r["created_at"], r["_id"]) < after]
+        for rnd in rounds[:limit] if limit else rounds:
+            yield _copy(rnd)
+
+    async def create(self, doc: dict) -> Optional[dict]:
+        if doc.get("_id") in self.t.rounds:
+            return None
+        doc.setdefault("_id", _new_id())
+        self.t.rounds[doc["_id"]] = dict(doc)
+        self.t.rounds_by_group[doc["group_id"]].append(doc["_id"])
+        return doc
+
+    async def get_version(self, round_id: str) -> Optional[int]:
+        rnd = self.t.rounds.get(round_id)
+        return rnd.get("version", 0) if rnd else None
+
+    async def touch_group(self, group_id: str):
+        for round_id in self.t.rounds_by_group.get(group_id, ()):
+            _bump(self.t.rounds[round_id])
+
+    async def claim_advance(self, round_id: str, from_status: str, next_round_id: str) -> bool:
+        rnd = self.t.rounds.get(round_id)
+        if rnd is None or rnd["status"] != from_status or rnd.get("next_round_id"):
+            return False
+        rnd.update(status="completed", next_round_id=next_round_id, completed_at=datetime.utcnow())
+        _bump(rnd)
+        return True
+
+    async def scan_due(
+        self, cutoff: datetime, after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        due = [r for r in self.t.rounds.values() if r["status"] == "active" and r["created_at"] < cutoff]
+        due.sort(key=lambda r: (r["created_at"], r["_id"]))
+        if after:
+            due = [r for r in due if (r["created_at"], r["_id"]) > after]
+        for rnd in due[:limit] if limit else due:
+            yield _copy(rnd)
+
+    async def complete_active(self, group_id: str) -> List[str]:
+        completed = []
+        for round_id in self.t.rounds_by_group.get(group_id, ()):
+            rnd = self.t.rounds[round_id]
+            if rnd["status"] == "active":
+                rnd.update(status="completed", completed_at=datetime.utcnow())
+                _bump(rnd)
+                completed.append(round_id)
+        return completed
+
+    async def scan_archivable(self, cutoff: datetime, limit: int) -> AsyncIterator[dict]:
+        rounds = [
+            r for r in self.t.rounds.values()
+            if r["status"] == "completed"
+            and r["created_at"] < cutoff
+            and (r.get("completed_at") is None or r["completed_at"] < cutoff)
+        ]
+        rounds.sort(key=lambda r: (r["created_at"], r["_id"]))
+        for rnd in rounds[:limit]:
+            yield _copy(rnd)
+
+    async def init_counters(self, round_id: str, total_members: int):
+        if round_id in self.t.rounds:
+            self.t.rounds[round_id].update(total_members=total_members, completed_count=0)
+            _bump(self.t.rounds[round_id])
+
+    async def record_completion(self, round_id: str) -> Optional[dict]:
+        rnd = self.t.rounds.get(round_id)
+        if rnd is None:
+            return None
+        rnd["completed_count"] = rnd.get("completed_count", 0) + 1
+        _bump(rnd)
+        return {
+            "_id": round_id,
+            "total_members": rnd.get("total_members", 0),
+            "completed_count": rnd["completed_count"],
+            "group_id": rnd["group_id"],
+            "created_at": rnd["created_at"],
+        }
+
+    async def reconcile_counters(self, only_active: bool = True, batch_size: int = 500) -> int:
+        repaired = 0
+        for round_id, rnd in self.t.rounds.items():
+            if only_active and rnd["status"] != "active":
+                continue
+            deeds = [self.t.deeds[did] for did in self.t.deeds_by_round.get(round_id, {}).values()]
+            total, completed = len(deeds), sum(1 for d in deeds if d["completed"])
+            if rnd.get("total_members") != total or rnd.get("completed_count") != completed:
+                rnd.update(total_members=total, completed_count=completed)
+                _bump(rnd)
+                repaired += 1
+        return repaired
+
+    async def member_statuses(self, round_id: str) -> Optional[List[dict]]:
+        rnd = self.t.rounds.get(round_id)
+        if rnd is None:
+            return None
+
+        deeds = self.t.deeds_by_round.get(round_id, {})
+        results = []
+        for user_id in self.t.members_by_group.get(rnd["group_id"], {}):
+            deed = self.t.deeds[deeds[user_id]] if user_id in deeds else {}
+            results.append({
+                "_id": user_id,
+                "completed": deed.get("completed", False),
+                "deed_description": deed.get("deed_description"),
+            })
+        return results
+
+
+class MemoryDeedRepository(DeedRepository):
+    def __init__(self, tables: MemoryTables):
+        self.t = tables
+
+    async def insert_many(self, docs: List[dict]):
+        for doc in docs:
+            doc["_id"] = _new_id()
+            self.t.deeds[doc["_id"]] = dict(doc)
+            self.t.deeds_by_round[doc["round_id"]][doc["user_id"]] = doc["_id"]
+            self.t.deed_ids_by_round[doc["round_id"]].add(doc["_id"])
+
+    async def get_for_user(self, round_id: str, user_id: str) -> Optional[dict]:
+        deed_id = self.t.deeds_by_round.get(round_id, {}).get(user_id)
+        return _copy(self.t.deeds.get(deed_id)) if deed_id else None
+
+    async def complete(self, round_id: str, user_id: str, completed_at: datetime) -> Optional[dict]:
+        deed_id = self.t.deeds_by_round.get(round_id, {}).get(user_id)
+        if deed_id is None:
+            return None
+        deed = self.t.deeds[deed_id]
+        before = dict(deed)
+        if not deed.get("completed"):
+            deed.update(completed=True, completed_at=completed_at)
+        return before
+
+    def scan_for_round(self, round_id: str, after: Optional[str] = None, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        return _scan_by_id(self.t.deeds, self.t.deed_ids_by_round.get(round_id, IdIndex()), after, limit)
+
+
+class MemoryTemplateRepository(TemplateRepository):
+    def __init__(self, tables: MemoryTables):
+        self.t = tables
+
+    async def list(self) -> List[dict]:
+        return [_copy(t) for t in sorted(self.t.templates.values(), key=lambda t: t["_id"])]
+
+    async def create(self, description: str) -> Optional[dict]:
+        if description in self.t.templates_by_description:
+            return None
+        doc = {"_id": _new_id(), "description": description, "created_at": datetime.utcnow()}
+        self.t.templates[doc["_id"]] = doc
+        self.t.templates_by_description[description] = doc["_id"]
+        return _copy(doc)
+
+    async def delete(self, template_id: str) -> bool:
+        doc = self.t.templates.pop(template_id, None)
+        if doc is None:
+            return False
+        del self.t.templates_by_description[doc["description"]]
+        return True
+
+    async def seed(self, descriptions: List[str]) -> int:
+        count = 0
+        for description in descriptions:
+            if description not in self.t.templates_by_description:
+                await self.create(description)
+                count += 1
+        return count
+
+
+class MemoryCelebrationRepository(CelebrationRepository):
+    def __init__(self, tables: MemoryTables):
+        self.t = tables
+
+    async def has_seen(self, round_id: str, user_id: str) -> bool:
+        return (round_id, user_id) in self.t.celebrations
+
+    async def mark_seen(self, round_id: str, user_id: str) -> bool:
+        key = (round_id, user_id)
+        if key in self.t.celebrations:
+            return False
+        self.t.celebrations[key] = {
+            "_id": _new_id(),
+            "round_id": round_id,
+            "user_id": user_id,
+            "seen_at": datetime.utcnow(),
+        }
+        return True
+
+
+class MemoryPairHistoryRepository(PairHistoryRepository):
+    def __init__(self, tables: MemoryTables):
+        self.t = tables
+
+    async def recent_targets(self, group_id: str) -> Dict[str, List[str]]:
+        return {giver: list(targets) for giver, targets in self.t.pair_history.get(group_id, {}).items()}
+
+    async def record(self, group_id: str, pairs: List[Tuple[str, str]], keep: int):
+        history = self.t.pair_history[group_id]
+        for giver, target in pairs:
+            history[giver] = [target, *history.get(giver, ())][:keep]
+
+
+def _without_embedded(doc: Optional[dict]) -> Optional[dict]:
+    if doc is None:
+        return None
+    return {k: v for k, v in doc.items() if k not in ("deeds", "celebrations")}
+
+
+class MemoryArchiveRepository(ArchiveRepository):
+    def __init__(self, tables: MemoryTables):
+        self.t = tables
+
+    async def get(self, round_id: str) -> Optional[dict]:
+        return _without_embedded(self.t.archive.get(round_id))
+
+    async def scan_for_group(
+        self, group_id: str, after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        rounds = [self.t.archive[rid] for rid in self.t.archive_by_group.get(group_id, ())]
+        rounds.sort(key=lambda r: (r["created_at"], r["_id"]), reverse=True)
+        if after:
+            rounds = [r for r in rounds if (r["created_at"], r["_id"]) < after]
+        for rnd in rounds[:limit] if limit else rounds:
+            yield _without_embedded(rnd)
+
+    async def archive(self, rounds: List[dict]) -> int:
+        round_ids = {r["_id"] for r in rounds if r["_id"] in self.t.rounds}
+        celebrations: Dict[str, List[dict]] = defaultdict(list)
+        for key in [k for k in self.t.celebrations if k[0] in round_ids]:
+            mark = self.t.celebrations.pop(key)
+            celebrations[key[0]].append({"user_id": mark["user_id"], "seen_at": mark["seen_at"]})
+
+        archived_at = datetime.utcnow()
+        for round_id in round_ids:
+            rnd = self.t.rounds.pop(round_id)
+            self.t.rounds_by_group[rnd["group_id"]].remove(round_id)
+            deeds = [self.t.deeds.pop(did) for did in self.t.deeds_by_round.pop(round_id, {}).values()]
+            self.t.deed_ids_by_round.pop(round_id, None)
+            self.t.archive[round_id] = {
+                **rnd,
+                "deeds": [{k: v for k, v in d.items() if k not in ("_id", "round_id")} for d in deeds],
+                "celebrations": celebrations[round_id],
+                "archived_at": archived_at,
+            }
+            self.t.archive_by_group[rnd["group_id"]].append(round_id)
+        return len(round_ids)
+
+
+class MemoryStatsRepository(StatsRepository):
+    def __init__(self, tables: MemoryTables):
+        self.t = tables
+
+    async def record(self, group_id: str, increments: Dict[str, float]):
+        for key in (group_id, GLOBAL_STATS_ID):
+            rollup = self.t.stats.setdefault(key, {"_id": key})
+            for field, amount in increments.items():
+                rollup[field] = rollup.get(field, 0) + amount
+
+    async def get(self, group_id: Optional[str] = None) -> Optional[dict]:
+        return _copy(self.t.stats.get(group_id or GLOBAL_STATS_ID))
+
+    async def rebuild(self) -> int:
+        self.t.stats = {}
+        live = (
+            (rnd, [self.t.deeds[d] for d in self.t.deeds_by_round.get(round_id, {}).values()])
+            for round_id, rnd in self.t.rounds.items()
+        )
+        archived = ((rnd, rnd["deeds"]) for rnd in self.t.archive.values())
+        for rnd, deeds in (*live, *archived):
+            done = [d for d in deeds if d.get("completed")]
+            fully = bool(deeds) and len(done) == len(deeds)
+            await self.record(rnd["group_id"], {
+                "rounds_started": 1,
+                "rounds_completed": int(rnd["status"] == "completed"),
+                "rounds_fully_completed": int(fully),
+                "deeds_assigned": len(deeds),
+                "deeds_completed": len(done),
+                "deed_seconds": sum((d["completed_at"] - rnd["created_at"]).total_seconds() for d in done),
+                "round_seconds": (
+                    (max(d["completed_at"] for d in done) - rnd["created_at"]).total_seconds() if fully else 0
+                ),
+            })
+        return len(self.t.stats) - (GLOBAL_STATS_ID in self.t.stats)
+
+
+class MemoryStorage(Storage):
+    """Single-process storage with no database; data is lost on restart"""
+
+    kind = "memory"
+
+    def __init__(self):
+        self.tables = MemoryTables()
+        self.users = MemoryUserRepository(self.tables)
+        self.groups = MemoryGroupRepository(self.tables)
+        self.members = MemoryMemberRepository(self.tables)
+        self.rounds = MemoryRoundRepository(self.tables)
+        self.deeds = MemoryDeedRepository(self.tables)
+        self.templates = MemoryTemplateRepository(self.tables)
+        self.celebrations = MemoryCelebrationRepository(self.tables)
+        self.pair_history = MemoryPairHistoryRepository(self.tables)
+        self.archive = MemoryArchiveRepository(self.tables)
+        self.stats = MemoryStatsRepository(self.tables)
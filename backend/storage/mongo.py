@@ -0,0 +1,592 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from storage.base import (
+    ArchiveRepository,
+    CelebrationRepository,
+    DeedRepository,
+    GroupRepository,
+    MemberRepository,
+    PairHistoryRepository,
+    RoundRepository,
+    StatsRepository,
+    Storage,
+    TemplateRepository,
+    UserRepository,
+)
+from storage.pipelines import (
+    GLOBAL_STATS_ID,
+    round_status_pipeline,
+    stats_rollup_pipeline,
+    user_groups_pipeline,
+)
+
+COUNTER_FIELDS = {"_id": 1, "total_members": 1, "completed_count": 1}
+COMPLETION_FIELDS = {**COUNTER_FIELDS, "group_id": 1, "created_at": 1}
+# Archive documents minus what is embedded, i.e. the round as it was
+ARCHIVED_ROUND_FIELDS = {"deeds": 0, "celebrations": 0}
+
+# References to other documents are stored as ObjectId and handed to callers
+# as hex strings, like `_id`. Documents written before migration 8 hold hex
+# strings; until it has run and every worker writes ObjectId, reads match both.
+DUAL_READ_REFS = os.getenv("DUAL_READ_REFS", "true").lower() == "true"
+MEMBER_REFS = ("group_id", "user_id")
+ROUND_REFS = ("group_id",)
+DEED_REFS = ("round_id", "user_id")
+
+
+def _with_str_id(doc: Optional[dict], refs: Tuple[str, ...] = ()) -> Optional[dict]:
+    if doc is not None:
+        doc["_id"] = str(doc["_id"])
+        for field in refs:
+            if field in doc:
+                doc[field] = str(doc[field])
+    return doc
+
+
+def _ref(ref_id: str):
+    """A reference as stored; a string that is not an id stays a string, which matches no typed reference"""
+    return ObjectId(ref_id) if ObjectId.is_valid(ref_id) else ref_id
+
+
+def _to_refs(doc: dict, refs: Tuple[str, ...]) -> dict:
+    """Copy of a caller's document with its references as ObjectId, ready to store"""
+    return {**doc, **{field: _ref(doc[field]) for field in refs if field in doc}}
+
+
+def _match_ref(ref_id: str):
+    """Query value matching a stored reference to `ref_id`"""
+    ref = _ref(ref_id)
+    return {"$in": [ref, ref_id]} if DUAL_READ_REFS and ref is not ref_id else ref
+
+
+def _match_refs(ref_ids: List[str]) -> dict:
+    refs = [_ref(ref_id) for ref_id in ref_ids]
+    return {"$in": [*refs, *ref_ids] if DUAL_READ_REFS else refs}
+
+
+async def _scan_by_id(
+    col, query: dict, after: Optional[str], limit: Optional[int], refs: Tuple[str, ...] = ()
+) -> AsyncIterator[dict]:
+    if after:
+        query = {**query, "_id": {"$gt": ObjectId(after)}}
+    cursor = col.find(query).sort("_id", ASCENDING)
+    if limit:
+        cursor = cursor.limit(limit)
+    async for doc in cursor:
+        yield _with_str_id(doc, refs)
+
+
+class MongoUserRepository(UserRepository):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.col = db["users"]
+
+    def scan(self, after: Optional[str] = None, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        return _scan_by_id(self.col, {}, after, limit)
+
+    async def create(self, name: str) -> Optional[dict]:
+        doc = {"name": name, "created_at": datetime.utcnow()}
+        try:
+            res = await self.col.insert_one(doc)
+        except DuplicateKeyError:
+            return None
+        doc["_id"] = str(res.inserted_id)
+        return doc
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        return _with_str_id(await self.col.find_one({"_id": ObjectId(user_id)}))
+
+    async def get_by_name(self, name: str) -> Optional[dict]:
+        return _with_str_id(await self.col.find_one({"name": name}))
+
+    async def get_many(self, user_ids: List[str]) -> List[dict]:
+        if not user_ids:
+            return []
+        cursor = self.col.find({"_id": {"$in": [ObjectId(uid) for uid in dict.fromkeys(user_ids)]}})
+        return [_with_str_id(u) async for u in cursor]
+
+    async def create_many(self, names: List[str]) -> List[dict]:
+        created_at = datetime.utcnow()
+        docs = [{"name": name, "created_at": created_at} for name in dict.fromkeys(names)]
+        if not docs:
+            return []
+        taken = set()
+        try:
+            await self.col.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Taken names fail on the unique index; the rest of the batch still applied
+            if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                raise
+            taken = {err["index"] for err in e.details["writeErrors"]}
+        # insert_many sets each `_id` client-side
+        return [_with_str_id(doc) for i, doc in enumerate(docs) if i not in taken]
+
+    async def get_many_by_name(self, names: List[str]) -> List[dict]:
+        if not names:
+            return []
+        return [_with_str_id(u) async for u in self.col.find({"name": {"$in": list(dict.fromkeys(names))}})]
+
+
+class MongoGroupRepository(GroupRepository):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.col = db["groups"]
+
+    def scan(self, after: Optional[str] = None, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        return _scan_by_id(self.col, {}, after, limit)
+
+    async def create(self, name: str) -> dict:
+        doc = {"name": name, "created_at": datetime.utcnow()}
+        res = await self.col.insert_one(doc)
+        doc["_id"] = str(res.inserted_id)
+        return doc
+
+    async def get(self, group_id: str) -> Optional[dict]:
+        return _with_str_id(await self.col.find_one({"_id": ObjectId(group_id)}))
+
+    async def get_many(self, group_ids: List[str]) -> List[dict]:
+        if not group_ids:
+            return []
+        cursor = self.col.find({"_id": {"$in": [ObjectId(gid) for gid in dict.fromkeys(group_ids)]}})
+        return [_with_str_id(g) async for g in cursor]
+
+    async def set_exclusions(self, group_id: str, pairs: List[Tuple[str, str]]) -> bool:
+        res = await self.col.update_one(
+            {"_id": ObjectId(group_id)}, {"$set": {"exclusions": [list(p) for p in pairs]}}
+        )
+        return res.matched_count == 1
+
+    async def set_template_heat(self, group_id: str, heat: Dict[str, float]):
+        # Pairs rather than a subdocument: descriptions may contain "." or "$"
+        await self.col.update_one(
+            {"_id": ObjectId(group_id)}, {"$set": {"template_heat": [[t, h] for t, h in heat.items()]}}
+        )
+
+
+class MongoMemberRepository(MemberRepository):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.col = db["group_members"]
+
+    async def add(self, group_id: str, user_id: str):
+        await self.col.update_one(
+            {"group_id": _match_ref(group_id), "user_id": _match_ref(user_id)},
+            {"$setOnInsert": {
+                "group_id": _ref(group_id), "user_id": _ref(user_id), "joined_at": datetime.utcnow(),
+            }},
+            upsert=True,
+        )
+
+    async def add_many(self, memberships: List[Tuple[str, str]]) -> int:
+        joined_at = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {"group_id": _match_ref(group_id), "user_id": _match_ref(user_id)},
+                {"$setOnInsert": {"group_id": _ref(group_id), "user_id": _ref(user_id), "joined_at": joined_at}},
+                upsert=True,
+            )
+            for group_id, user_id in dict.fromkeys(memberships)
+        ]
+        if not ops:
+            return 0
+        try:
+            res = await self.col.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # Concurrent upserts of the same membership lose on the unique index
+            if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                raise
+            return e.details["nUpserted"]
+        return res.upserted_count
+
+    async def list_user_ids(self, group_id: str) -> List[str]:
+        cursor = self.col.find({"group_id": _match_ref(group_id)}, {"_id": 0, "user_id": 1})
+        return [str(m["user_id"]) async for m in cursor]
+
+    async def list_groups(self, user_id: str) -> List[dict]:
+        pipeline = user_groups_pipeline(_match_ref(user_id), DUAL_READ_REFS)
+        return await self.col.aggregate(pipeline).to_list(length=None)
+
+
+class MongoRoundRepository(RoundRepository):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.col = db["rounds"]
+        self.deeds_col = db["deeds"]
+
+    async def get(self, round_id: str) -> Optional[dict]:
+        return _with_str_id(await self.col.find_one({"_id": ObjectId(round_id)}), ROUND_REFS)
+
+    async def get_active(self, group_id: str) -> Optional[dict]:
+        rnd = await self.col.find_one({"group_id": _match_ref(group_id), "status": "active"})
+        return _with_str_id(rnd, ROUND_REFS)
+
+    async def get_version(self, round_id: str) -> Optional[int]:
+        rnd = await self.col.find_one({"_id": ObjectId(round_id)}, {"version": 1})
+        return rnd.get("version", 0) if rnd else None
+
+    async def touch_group(self, group_id: str):
+        await self.col.update_many({"group_id": _match_ref(group_id)}, {"$inc": {"version": 1}})
+
+    async def scan_for_group(
+        self, group_id: str, after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        query = {"group_id": _match_ref(group_id)}
+        if after:
+            created_at, round_id = after
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": ObjectId(round_id)}},
+            ]
+        cursor = self.col.find(query).sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+        if limit:
+            cursor = cursor.limit(limit)
+        async for rnd in cursor:
+            yield _with_str_id(rnd, ROUND_REFS)
+
+    async def create(self, doc: dict) -> Optional[dict]:
+        stored = _to_refs(doc, ROUND_REFS)
+        if "_id" in doc:
+            stored["_id"] = ObjectId(doc["_id"])
+        try:
+            res = await self.col.insert_one(stored)
+        except DuplicateKeyError:
+            return None
+        doc["_id"] = str(res.inserted_id)
+        return doc
+
+    async def claim_advance(self, round_id: str, from_status: str, next_round_id: str) -> bool:
+        res = await self.col.update_one(
+            {"_id": ObjectId(round_id), "status": from_status, "next_round_id": None},
+            {
+                "$set": {"status": "completed", "next_round_id": next_round_id, "completed_at": datetime.utcnow()},
+                "$inc": {"version": 1},
+            },
+        )
+        return res.modified_count == 1
+
+    async def scan_due(
+        self, cutoff: datetime, after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        query = {"status": "active", "created_at": {"$lt": cutoff}}
+        if after:
+            created_at, round_id = after
+            query["$or"] = [
+                {"created_at": {"$gt": created_at}},
+                {"created_at": created_at, "_id": {"$gt": ObjectId(round_id)}},
+            ]
+        cursor = self.col.find(query).sort([("created_at", ASCENDING), ("_id", ASCENDING)])
+        if limit:
+            cursor = cursor.limit(limit)
+        async for rnd in cursor:
+            yield _with_str_id(rnd, ROUND_REFS)
+
+    async def complete_active(self, group_id: str) -> List[str]:
+        active = await self.col.find({"group_id": _match_ref(group_id), "status": "active"}, {"_id": 1}).to_list(length=None)
+        if not active:
+            return []
+        await self.col.update_many(
+            {"_id": {"$in": [r["_id"] for r in active]}},
+            {"$set": {"status": "completed", "completed_at": datetime.utcnow()}, "$inc": {"version": 1}},
+        )
+        return [str(r["_id"]) for r in active]
+
+    async def scan_archivable(self, cutoff: datetime, limit: int) -> AsyncIterator[dict]:
+        # status + created_at ride the rotation index; completed_at is checked on what it finds
+        query = {"status": "completed", "created_at": {"$lt": cutoff}, "completed_at": {"$not": {"$gte": cutoff}}}
+        cursor = self.col.find(query).sort([("created_at", ASCENDING), ("_id", ASCENDING)]).limit(limit)
+        async for rnd in cursor:
+            yield _with_str_id(rnd, ROUND_REFS)
+
+    async def init_counters(self, round_id: str, total_members: int):
+        await self.col.update_one(
+            {"_id": ObjectId(round_id)},
+            {"$set": {"total_members": total_members, "completed_count": 0}, "$inc": {"version": 1}},
+        )
+
+    async def record_completion(self, round_id: str) -> Optional[dict]:
+        return _with_str_id(await self.col.find_one_and_update(
+            {"_id": ObjectId(round_id)},
+            {"$inc": {"completed_count": 1, "version": 1}},
+            projection=COMPLETION_FIELDS,
+            return_document=ReturnDocument.AFTER,
+        ), ROUND_REFS)
+
+    async def reconcile_counters(self, only_active: bool = True, batch_size: int = 500) -> int:
+        query = {"status": "active"} if only_active else {}
+        repaired = 0
+        batch: List[dict] = []
+
+        async def flush():
+            nonlocal repaired
+            ids = [str(r["_id"]) for r in batch]
+            actual = {
+                row["_id"]: row
+                async for row in self.deeds_col.aggregate([
+                    {"$match": {"round_id": _match_refs(ids)}},
+                    {"$group": {
+                        # Keyed by hex so both stored forms of a reference count together
+                        "_id": {"$toString": "$round_id"},
+                        "total": {"$sum": 1},
+                        "completed": {"$sum": {"$cond": ["$completed", 1, 0]}},
+                    }},
+                ])
+            }
+            ops = []
+            for rnd in batch:
+                row = actual.get(str(rnd["_id"]), {"total": 0, "completed": 0})
+                if rnd.get("total_members") != row["total"] or rnd.get("completed_count") != row["completed"]:
+                    ops.append(UpdateOne({"_id": rnd["_id"]}, {
+                        "$set": {"total_members": row["total"], "completed_count": row["completed"]},
+                        "$inc": {"version": 1},
+                    }))
+            if ops:
+                await self.col.bulk_write(ops, ordered=False)
+                repaired += len(ops)
+            batch.clear()
+
+        async for rnd in self.col.find(query, COUNTER_FIELDS):
+            batch.append(rnd)
+            if len(batch) >= batch_size:
+                await flush()
+        if batch:
+            await flush()
+        return repaired
+
+    async def member_statuses(self, round_id: str) -> Optional[List[dict]]:
+        rows = await self.col.aggregate(round_status_pipeline(round_id, DUAL_READ_REFS)).to_list(length=None)
+        if not rows:
+            return None
+        return [row for row in rows if row["_id"] is not None]
+
+
+class MongoDeedRepository(DeedRepository):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.col = db["deeds"]
+
+    async def insert_many(self, docs: List[dict]):
+        if docs:
+            stored = [_to_refs(doc, DEED_REFS) for doc in docs]
+            await self.col.insert_many(stored)
+            # insert_many sets each `_id` client-side
+            for doc, row in zip(docs, stored):
+                doc["_id"] = str(row["_id"])
+
+    async def get_for_user(self, round_id: str, user_id: str) -> Optional[dict]:
+        query = {"round_id": _match_ref(round_id), "user_id": _match_ref(user_id)}
+        return _with_str_id(await self.col.find_one(query), DEED_REFS)
+
+    async def complete(self, round_id: str, user_id: str, completed_at: datetime) -> Optional[dict]:
+        query = {"round_id": _match_ref(round_id), "user_id": _match_ref(user_id)}
+        # Only an open deed is written, so a duplicate submission never rewrites a completed one
+        before = await self.col.find_one_and_update(
+            {**query, "completed": {"$ne": True}},
+            {"$set": {"completed": True, "completed_at": completed_at}},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if before is None:
+            # Already completed, or not assigned at all: one read tells which
+            before = await self.col.find_one(query)
+        return _with_str_id(before, DEED_REFS)
+
+    def scan_for_round(self, round_id: str, after: Optional[str] = None, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        return _scan_by_id(self.col, {"round_id": _match_ref(round_id)}, after, limit, DEED_REFS)
+
+
+class MongoTemplateRepository(TemplateRepository):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.col = db["deed_templates"]
+
+    async def list(self) -> List[dict]:
+        return [_with_str_id(t) async for t in self.col.find().sort("_id", ASCENDING)]
+
+    async def create(self, description: str) -> Optional[dict]:
+        doc = {"description": description, "created_at": datetime.utcnow()}
+        try:
+            res = await self.col.insert_one(doc)
+        except DuplicateKeyError:
+            return None
+        doc["_id"] = str(res.inserted_id)
+        return doc
+
+    async def delete(self, template_id: str) -> bool:
+        res = await self.col.delete_one({"_id": ObjectId(template_id)})
+        return res.deleted_count > 0
+
+    async def seed(self, descriptions: List[str]) -> int:
+        if not descriptions:
+            return 0
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne({"description": d}, {"$setOnInsert": {"description": d, "created_at": now}}, upsert=True)
+            for d in dict.fromkeys(descriptions)
+        ]
+        try:
+            res = await self.col.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # A concurrent import upserting the same description loses on the
+            # unique index; the rest of the batch still applied
+            if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                raise
+            return e.details["nUpserted"]
+        return res.upserted_count
+
+
+class MongoCelebrationRepository(CelebrationRepository):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.col = db["celebrations_seen"]
+
+    async def has_seen(self, round_id: str, user_id: str) -> bool:
+        return await self.col.find_one({"round_id": round_id, "user_id": user_id}, {"_id": 1}) is not None
+
+    async def mark_seen(self, round_id: str, user_id: str) -> bool:
+        # Upsert behind the unique (round_id, user_id) index; only the first mark inserts
+        try:
+            res = await self.col.update_one(
+                {"round_id": round_id, "user_id": user_id},
+                {"$setOnInsert": {"round_id": round_id, "user_id": user_id, "seen_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return res.upserted_id is not None
+
+
+class MongoPairHistoryRepository(PairHistoryRepository):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.col = db["pair_history"]
+
+    async def recent_targets(self, group_id: str) -> Dict[str, List[str]]:
+        cursor = self.col.find({"group_id": group_id}, {"_id": 0, "user_id": 1, "recent": 1})
+        return {doc["user_id"]: doc.get("recent", []) async for doc in cursor}
+
+    async def record(self, group_id: str, pairs: List[Tuple[str, str]], keep: int):
+        if not pairs:
+            return
+        # One bulk write however big the group; $slice keeps each history bounded
+        await self.col.bulk_write([
+            UpdateOne(
+                {"_id": f"{group_id}:{giver}"},
+                {
+                    "$set": {"group_id": group_id, "user_id": giver},
+                    "$push": {"recent": {"$each": [target], "$position": 0, "$slice": keep}},
+                },
+                upsert=True,
+            )
+            for giver, target in pairs
+        ], ordered=False)
+
+
+class MongoArchiveRepository(ArchiveRepository):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.col = db["round_archive"]
+        self.rounds_col = db["rounds"]
+        self.deeds_col = db["deeds"]
+        self.celebrations_col = db["celebrations_seen"]
+
+    async def get(self, round_id: str) -> Optional[dict]:
+        return _with_str_id(await self.col.find_one({"_id": ObjectId(round_id)}, ARCHIVED_ROUND_FIELDS), ROUND_REFS)
+
+    async def scan_for_group(
+        self, group_id: str, after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        query = {"group_id": _match_ref(group_id)}
+        if after:
+            created_at, round_id = after
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": ObjectId(round_id)}},
+            ]
+        cursor = self.col.find(query, ARCHIVED_ROUND_FIELDS).sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+        if limit:
+            cursor = cursor.limit(limit)
+        async for rnd in cursor:
+            yield _with_str_id(rnd, ROUND_REFS)
+
+    async def archive(self, rounds: List[dict]) -> int:
+        if not rounds:
+            return 0
+        round_ids = [r["_id"] for r in rounds]
+        # Embedded copies drop their own ids and the round id they sit under
+        embedded = {"_id": 0}
+        deeds: Dict[str, List[dict]] = {rid: [] for rid in round_ids}
+        async for deed in self.deeds_col.find({"round_id": _match_refs(round_ids)}, embedded):
+            deeds[str(deed.pop("round_id"))].append(deed)
+        celebrations: Dict[str, List[dict]] = {rid: [] for rid in round_ids}
+        async for mark in self.celebrations_col.find({"round_id": {"$in": round_ids}}, embedded):
+            celebrations[mark.pop("round_id")].append(mark)
+
+        # A retry finds some live documents already deleted, so it must never
+        # overwrite the archive document the interrupted attempt wrote
+        archived_at = datetime.utcnow()
+        await self.col.bulk_write([
+            UpdateOne(
+                {"_id": ObjectId(rnd["_id"])},
+                {"$setOnInsert": {
+                    **{k: v for k, v in _to_refs(rnd, ROUND_REFS).items() if k != "_id"},
+                    "deeds": deeds[rnd["_id"]],
+                    "celebrations": celebrations[rnd["_id"]],
+                    "archived_at": archived_at,
+                }},
+                upsert=True,
+            )
+            for rnd in rounds
+        ], ordered=False)
+
+        await self.deeds_col.delete_many({"round_id": _match_refs(round_ids)})
+        await self.celebrations_col.delete_many({"round_id": {"$in": round_ids}})
+        res = await self.rounds_col.delete_many({"_id": {"$in": [ObjectId(rid) for rid in round_ids]}})
+        return res.deleted_count
+
+
+class MongoStatsRepository(StatsRepository):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.col = db["stats_rollups"]
+        self.rounds_col = db["rounds"]
+        self.archive_col = db["round_archive"]
+
+    async def record(self, group_id: str, increments: Dict[str, float]):
+        update = {"$inc": increments}
+        await self.col.bulk_write([
+            UpdateOne({"_id": group_id}, update, upsert=True),
+            UpdateOne({"_id": GLOBAL_STATS_ID}, update, upsert=True),
+        ], ordered=False)
+
+    async def get(self, group_id: Optional[str] = None) -> Optional[dict]:
+        return await self.col.find_one({"_id": group_id or GLOBAL_STATS_ID})
+
+    async def rebuild(self) -> int:
+        pipeline = stats_rollup_pipeline(self.col.name, self.archive_col.name, DUAL_READ_REFS)
+        await self.rounds_col.aggregate(pipeline).to_list(length=None)
+        # $merge only replaces; drop rollups of groups that no longer have rounds
+        group_ids = [*await self.rounds_col.distinct("group_id"), *await self.archive_col.distinct("group_id")]
+        await self.col.delete_many({"_id": {"$nin": [*{str(gid) for gid in group_ids}, GLOBAL_STATS_ID]}})
+        return await self.col.count_documents({"_id": {"$ne": GLOBAL_STATS_ID}})
+
+
+class MongoStorage(Storage):
+    kind = "mongo"
+
+    def __init__(self, client: AsyncIOMotorClient, db: AsyncIOMotorDatabase):
+        self.client = client
+        self.db = db
+        self.users = MongoUserRepository(db)
+        self.groups = MongoGroupRepository(db)
+        self.members = MongoMemberRepository(db)
+        self.rounds = MongoRoundRepository(db)
+        self.deeds = MongoDeedRepository(db)
+        self.templates = MongoTemplateRepository(db)
+        self.celebrations = MongoCelebrationRepository(db)
+        self.pair_history = MongoPairHistoryRepository(db)
+        self.archive = MongoArchiveRepository(db)
+        self.stats = MongoStatsRepository(db)
+
+    async def close(self):
+        self.client.close()
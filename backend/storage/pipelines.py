@@ -0,0 +1,122 @@
+from typing import Any, List, Optional
+
+from bson import ObjectId
+
+# Pipelines take `dual`: whether some references may still be stored as hex
+# strings (see DUAL_READ_REFS). Every join is a localField/foreignField
+# equality $lookup either way, so the server answers it from the index on
+# `foreign_field`.
+
+
+def lookup_ref(
+    from_collection: str,
+    local_field: str,
+    foreign_field: str,
+    as_field: str,
+    dual: bool,
+    match: Optional[dict] = None,
+    unwind: bool = False,
+) -> List[dict]:
+    """Stages joining documents whose `foreign_field` refers to the same document as `local_field`.
+
+    With `dual`, the local value is widened to both of its forms first;
+    $lookup matches an array localField against any of its elements.
+    `match` narrows the joined documents further, and `unwind` turns each
+    joined document into its own output document (keeping those with none).
+    """
+    lookup = {"$lookup": {"from": from_collection, "localField": local_field, "foreignField": foreign_field, "as": as_field}}
+    if match:
+        lookup["$lookup"]["pipeline"] = [{"$match": match}]
+    # Directly after its $lookup, the server folds $unwind into the join, so
+    # the joined documents are never gathered into one array
+    stages = [lookup, {"$unwind": {"path": f"${as_field}", "preserveNullAndEmptyArrays": True}}] if unwind else [lookup]
+    if not dual:
+        return stages
+    keys = f"_{as_field}_keys"
+    lookup["$lookup"]["localField"] = keys
+    return [
+        {"$set": {keys: [
+            {"$convert": {"input": f"${local_field}", "to": "objectId", "onError": f"${local_field}"}},
+            {"$toString": f"${local_field}"},
+        ]}},
+        *stages,
+        {"$project": {keys: 0}},
+    ]
+
+
+def user_groups_pipeline(user_match: Any, dual: bool) -> List[dict]:
+    """group_members -> groups: one `Group`-shaped document per membership"""
+    return [
+        {"$match": {"user_id": user_match}},
+        *lookup_ref("groups", "group_id", "_id", "group", dual),
+        {"$unwind": "$group"},
+        {"$project": {"_id": {"$toString": "$group_id"}, "name": "$group.name", "created_at": "$group.created_at"}},
+    ]
+
+
+def round_status_pipeline(round_id: str, dual: bool) -> List[dict]:
+    """rounds -> group_members -> deeds: `MemberStatus` rows for a round, less `name`.
+
+    Yields one document per member, each joined to its deed through the
+    `(round_id, user_id)` index. A round without members yields a single
+    document with a null `_id`; a missing round yields nothing.
+    """
+    round_ref = ObjectId(round_id)
+    return [
+        {"$match": {"_id": round_ref}},
+        {"$project": {"group_id": 1}},
+        *lookup_ref("group_members", "group_id", "group_id", "member", dual, unwind=True),
+        *lookup_ref(
+            "deeds", "member.user_id", "user_id", "deed", dual,
+            match={"round_id": {"$in": [round_ref, round_id]} if dual else round_ref},
+            unwind=True,
+        ),
+        {"$project": {
+            "_id": {"$toString": "$member.user_id"},
+            "completed": {"$ifNull": ["$deed.completed", False]},
+            "deed_description": "$deed.deed_description",
+        }},
+    ]
+
+
+# `_id` of the rollup summing every group; group ids are ObjectId hex so never collide
+GLOBAL_STATS_ID = "all"
+
+
+# What the rollup reads of a round and its deeds
+ROLLUP_FIELDS = {"group_id": 1, "status": 1, "created_at": 1, "deeds.completed": 1, "deeds.completed_at": 1}
+
+
+def stats_rollup_pipeline(into: str, archive: str, dual: bool) -> List[dict]:
+    """rounds + archived rounds: rebuild every group's stats rollup, and the global one, into `into`"""
+    return [
+        # Live rounds gather their deeds; archived rounds already embed them
+        *lookup_ref("deeds", "_id", "round_id", "deeds", dual),
+        {"$project": ROLLUP_FIELDS},
+        {"$unionWith": {"coll": archive, "pipeline": [{"$project": ROLLUP_FIELDS}]}},
+        {"$set": {"done": {"$filter": {"input": "$deeds", "cond": "$$this.completed"}}}},
+        {"$set": {
+            "assigned": {"$size": "$deeds"},
+            "completed": {"$size": "$done"},
+            "last_completed_at": {"$max": "$done.completed_at"},
+            "deed_ms": {"$sum": {"$map": {"input": "$done", "in": {"$subtract": ["$$this.completed_at", "$created_at"]}}}},
+        }},
+        {"$set": {"fully": {"$and": [{"$gt": ["$assigned", 0]}, {"$gte": ["$completed", "$assigned"]}]}}},
+        # Every round counts towards its group's rollup and the global one
+        # Rollups are keyed by the hex group id callers use
+        {"$set": {"rollup": [{"$toString": "$group_id"}, GLOBAL_STATS_ID]}},
+        {"$unwind": "$rollup"},
+        {"$group": {
+            "_id": "$rollup",
+            "rounds_started": {"$sum": 1},
+            "rounds_completed": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}},
+            "rounds_fully_completed": {"$sum": {"$cond": ["$fully", 1, 0]}},
+            "deeds_assigned": {"$sum": "$assigned"},
+            "deeds_completed": {"$sum": "$completed"},
+            "deed_seconds": {"$sum": {"$divide": ["$deed_ms", 1000]}},
+            "round_seconds": {"$sum": {"$cond": [
+                "$fully", {"$divide": [{"$subtract": ["$last_completed_at", "$created_at"]}, 1000]}, 0,
+            ]}},
+        }},
+        {"$merge": {"into": into, "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
@@ -0,0 +1,85 @@
+"""Database calls per request for the member list endpoints stay flat as groups grow.
+
+Each request is driven through the app in-process against the in-memory
+backend, and every repository call it makes is counted, the same way the
+endpoint benchmark counts them. Run from backend/: python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import asyncio
+import json
+from typing import Dict, Tuple
+
+import pytest
+
+import main
+from benchmarks.asgi import call
+from benchmarks.bench_endpoints import CountingStorage, DbCallCounter
+from services.assignment import DEFAULT_DEED_TEMPLATES
+from services.user_directory import user_directory
+from storage.memory import MemoryStorage
+
+GROUP_SIZES = [1, 5, 50]
+
+# (storage calls with a cold user directory, with a warm one) per endpoint
+EXPECTED_CALLS: Dict[str, Tuple[int, int]] = {
+    # member ids, then one batched lookup of the names not yet cached
+    "GET /groups/{group_id}/members": (2, 1),
+    # round version for the ETag, the joined statuses, then the names
+    "GET /rounds/{round_id}/status": (3, 2),
+    # memberships joined to their groups
+    "GET /users/{user_id}/groups": (1, 1),
+}
+
+
+async def seed(size: int) -> Dict[str, str]:
+    storage = CountingStorage(MemoryStorage())
+    main.Backend.storage = storage
+    await storage.templates.seed(DEFAULT_DEED_TEMPLATES)
+
+    group = await storage.groups.create(f"group-{size}")
+    user_ids = []
+    for i in range(size):
+        user = await storage.users.create(f"member-{size}-{i}")
+        await storage.members.add(group["_id"], user["_id"])
+        user_ids.append(user["_id"])
+    status, body = await call(main.app, "POST", f"/groups/{group['_id']}/rounds", {"name": "round"})
+    assert status == 200, body
+    return {
+        "GET /groups/{group_id}/members": f"/groups/{group['_id']}/members",
+        "GET /rounds/{round_id}/status": f"/rounds/{json.loads(body)['_id']}/status",
+        "GET /users/{user_id}/groups": f"/users/{user_ids[0]}/groups",
+    }
+
+
+async def count_calls(path: str) -> int:
+    DbCallCounter.count = 0
+    status, body = await call(main.app, "GET", path)
+    assert status == 200, body
+    return DbCallCounter.count
+
+
+async def measure(size: int) -> Dict[str, Tuple[int, int]]:
+    paths = await seed(size)
+    counts = {}
+    for endpoint, path in paths.items():
+        user_directory.invalidate()
+        cold = await count_calls(path)
+        warm = await count_calls(path)
+        counts[endpoint] = (cold, warm)
+    return counts
+
+
+@pytest.fixture(autouse=True)
+def reset_backend():
+    yield
+    main.Backend.storage = None
+    user_directory.invalidate()
+
+
+@pytest.mark.parametrize("size", GROUP_SIZES)
+def test_member_lists_cost_a_fixed_number_of_db_calls(size: int):
+    assert asyncio.run(measure(size)) == EXPECTED_CALLS
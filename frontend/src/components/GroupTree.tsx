@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getRound, getRoundStatus, checkRoundComplete, advanceToNextRound, markCelebrationSeen, MemberStatus, Round } from '../services/api';
+import { getGroupDashboard, getRound, getRoundStatus, checkRoundComplete, advanceToNextRound, markCelebrationSeen, subscribeToRoundEvents, MemberStatus, Round } from '../services/api';
 import Ornament from './Ornament';
 import Celebration from './Celebration';
 import './GroupTree.css';
@@ -72,9 +72,10 @@ function getOrnamentPosition(index: number, odId: string) {
   };
 }
 
-function GroupTree(props: { roundId: string; groupName?: string }) {
+function GroupTree(props: { groupId: string; roundId: string; groupName?: string }) {
   var [members, setMembers] = useState<MemberStatus[]>([]);
   var [round, setRound] = useState<Round | null>(null);
+  var [loadedGroupName, setLoadedGroupName] = useState<string | null>(null);
   var [loading, setLoading] = useState(true);
   var [error, setError] = useState<string | null>(null);
   var [showCelebration, setShowCelebration] = useState(false);
@@ -94,18 +95,36 @@ function GroupTree(props: { roundId: string; groupName?: string }) {
     loadData();
   }, [currentRoundId]);
 
-  async function loadData() {
+  // Refresh when the server pushes progress instead of polling
+  useEffect(function() {
+    return subscribeToRoundEvents(currentRoundId, function(type) {
+      if (type === 'member-completed') {
+        getRoundStatus(currentRoundId).then(setMembers).catch(function() {});
+      } else {
+        loadData(true);
+      }
+    });
+  }, [currentRoundId]);
+
+  async function loadData(background?: boolean) {
     try {
-      setLoading(true);
+      if (!background) {
+        setLoading(true);
+      }
       setError(null);
 
       var user = getCurrentUser();
       var userId = user ? user._id : null;
 
-      // First check completion status
-      var completion = await checkRoundComplete(currentRoundId, userId);
+      // One request for the group, its active round, statuses and completion
+      var dashboard = await getGroupDashboard(props.groupId, userId);
+      setLoadedGroupName(dashboard.group.name);
+      var completion = dashboard.completion;
 
-      console.log('Completion check:', completion); // Debug log
+      // Our round is no longer the active one, so only it knows its celebration state
+      if (!completion || !dashboard.current_round || dashboard.current_round._id !== currentRoundId) {
+        completion = await checkRoundComplete(currentRoundId, userId);
+      }
 
       // If user should see celebration
       if (completion.show_celebration) {
@@ -125,10 +144,8 @@ function GroupTree(props: { roundId: string; groupName?: string }) {
       }
 
       // Load current round data normally
-      var roundData = await getRound(currentRoundId);
-      var statusData = await getRoundStatus(currentRoundId);
-      setRound(roundData);
-      setMembers(statusData);
+      setRound(dashboard.current_round);
+      setMembers(dashboard.members);
 
     } catch (err) {
       if (err instanceof Error) {
@@ -225,7 +242,7 @@ function GroupTree(props: { roundId: string; groupName?: string }) {
     );
   }
 
-  var groupName = props.groupName || (round ? round.name : 'Group');
+  var groupName = props.groupName || loadedGroupName || (round ? round.name : 'Group');
 
   return (
     <div className="group-tree-container">
@@ -38,6 +38,6 @@ export default function DashboardPage() {
   }
 
   return (
-    <GroupTree roundId={round._id} groupName={group.name} />
+    <GroupTree groupId={group._id} roundId={round._id} groupName={group.name} />
   );
 }
\ No newline at end of file
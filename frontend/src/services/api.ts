@@ -52,6 +52,14 @@ export interface RoundCompletion {
   new_round_id: string | null;
 }
 
+export interface GroupDashboard {
+  group: Group;
+  current_round: Round | null;
+  members: MemberStatus[];
+  completion: RoundCompletion | null;
+  my_deed: DeedAssignment | null;
+}
+
 // ============ Users ============
 
 export async function login(name: string): Promise<User> {
@@ -107,6 +115,17 @@ export async function getCurrentRound(groupId: string): Promise<Round> {
   return response.json();
 }
 
+// Group, current round, member statuses, completion and the user's deed in one request
+export async function getGroupDashboard(groupId: string, userId?: string): Promise<GroupDashboard> {
+  let url = `${API_BASE}/groups/${groupId}/dashboard`;
+  if (userId) {
+    url += `?user_id=${userId}`;
+  }
+  const response = await fetch(url);
+  if (!response.ok) throw new Error('Failed to fetch group');
+  return response.json();
+}
+
 export async function createRound(groupId: string, name: string): Promise<Round> {
   const response = await fetch(`${API_BASE}/groups/${groupId}/rounds`, {
     method: 'POST',
@@ -148,6 +167,27 @@ export async function markCelebrationSeen(roundId: string, userId: string): Prom
   if (!response.ok) throw new Error('Failed to mark celebration seen');
 }
 
+export type RoundEventType = 'member-completed' | 'round-complete' | 'round-advanced';
+
+export interface RoundEvent {
+  round_id: string;
+  user_id?: string;
+  new_round_id?: string;
+}
+
+// Subscribe to server-pushed progress for a round; returns a function that closes the stream
+export function subscribeToRoundEvents(
+  roundId: string,
+  onEvent: (type: RoundEventType, event: RoundEvent) => void,
+): () => void {
+  const source = new EventSource(`${API_BASE}/rounds/${roundId}/events`);
+  const types: RoundEventType[] = ['member-completed', 'round-complete', 'round-advanced'];
+  types.forEach((type) => {
+    source.addEventListener(type, (e) => onEvent(type, JSON.parse((e as MessageEvent).data)));
+  });
+  return () => source.close();
+}
+
 export async function advanceToNextRound(roundId: string): Promise<Round> {
   const response = await fetch(`${API_BASE}/rounds/${roundId}/advance`, {
     method: 'POST',